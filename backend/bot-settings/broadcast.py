@@ -0,0 +1,264 @@
+import os
+import smtplib
+import time
+from collections import Counter
+from email.message import EmailMessage
+from psycopg2.extras import execute_values
+from telegram import send_message_async, TelegramError
+
+# Telegram допускает около 30 сообщений в секунду на бота; лимиты общие для всех воркеров
+RATE = float(os.environ.get('BROADCAST_RATE', '25'))
+EMAIL_RATE = float(os.environ.get('BROADCAST_EMAIL_RATE', '5'))
+BATCH_SIZE = int(os.environ.get('BROADCAST_BATCH_SIZE', '50'))
+TIME_BUDGET = float(os.environ.get('BROADCAST_TIME_BUDGET', '20'))
+MAX_ATTEMPTS = int(os.environ.get('BROADCAST_MAX_ATTEMPTS', '5'))
+RETRY_DELAY = int(os.environ.get('BROADCAST_RETRY_DELAY', '30'))
+# Строки в статусе sending дольше этого времени считаются брошенными упавшим воркером
+STALE_LOCK = int(os.environ.get('BROADCAST_STALE_LOCK', '300'))
+
+SMTP_HOST = os.environ.get('SMTP_HOST', '')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '465'))
+SMTP_USER = os.environ.get('SMTP_USER', '')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+SMTP_FROM = os.environ.get('SMTP_FROM', SMTP_USER)
+
+CHANNELS = ('telegram', 'email')
+
+
+RATES = {'telegram': RATE, 'email': EMAIL_RATE}
+
+
+def available_channels() -> list:
+    '''Email доступен только при настроенном SMTP'''
+    return [channel for channel in CHANNELS if channel != 'email' or SMTP_HOST]
+
+
+def create_campaign(cur, text: str, title: str = None, subject: str = None, channels=None) -> dict:
+    '''Создать кампанию и одним запросом на канал заполнить очередь получателей'''
+    channels = [channel for channel in (channels or CHANNELS) if channel in available_channels()]
+    if not channels:
+        raise ValueError('Нет доступных каналов рассылки')
+
+    cur.execute(
+        'INSERT INTO broadcast_campaigns (title, message_text, email_subject) VALUES (%s, %s, %s) RETURNING id',
+        (title, text, subject)
+    )
+    campaign_id = cur.fetchone()['id']
+
+    recipients = {}
+    if 'telegram' in channels:
+        cur.execute('''
+            INSERT INTO broadcast_outbox (campaign_id, channel, recipient)
+            SELECT DISTINCT %s, 'telegram', c.telegram_user_id
+            FROM carts c
+            WHERE c.telegram_user_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM telegram_blocked_users b WHERE b.telegram_user_id = c.telegram_user_id)
+            ON CONFLICT DO NOTHING
+        ''', (campaign_id,))
+        recipients['telegram'] = cur.rowcount
+    if 'email' in channels:
+        cur.execute('''
+            INSERT INTO broadcast_outbox (campaign_id, channel, recipient)
+            SELECT %s, 'email', email FROM newsletter_subscribers WHERE active
+            ON CONFLICT DO NOTHING
+        ''', (campaign_id,))
+        recipients['email'] = cur.rowcount
+
+    return {'campaign_id': campaign_id, 'recipients': recipients}
+
+
+def campaign_status(cur, campaign_id: int = None) -> list:
+    '''Кампании со счётчиками получателей по статусам'''
+    cur.execute('''
+        SELECT c.id, c.title, c.status, c.created_at, c.updated_at,
+               COALESCE(json_object_agg(s.status, s.count) FILTER (WHERE s.status IS NOT NULL), '{}') AS recipients
+        FROM broadcast_campaigns c
+        LEFT JOIN (
+            SELECT campaign_id, status, COUNT(*) AS count
+            FROM broadcast_outbox
+            GROUP BY campaign_id, status
+        ) s ON s.campaign_id = c.id
+        WHERE %(id)s IS NULL OR c.id = %(id)s
+        GROUP BY c.id
+        ORDER BY c.id DESC
+        LIMIT 50
+    ''', {'id': campaign_id})
+    return [dict(row) for row in cur.fetchall()]
+
+
+def set_campaign_state(cur, campaign_id: int, status: str) -> bool:
+    '''Приостановить или возобновить кампанию; завершённые не трогаются'''
+    cur.execute('''
+        UPDATE broadcast_campaigns SET status = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status <> 'completed'
+    ''', (status, campaign_id))
+    return cur.rowcount > 0
+
+
+def claim_batch(cur, campaign_id: int) -> list:
+    '''Захватить порцию получателей; параллельные воркеры пропускают чужие строки'''
+    cur.execute('''
+        UPDATE broadcast_outbox o
+        SET status = 'sending', attempts = o.attempts + 1, locked_at = CURRENT_TIMESTAMP
+        WHERE o.id IN (
+            SELECT id FROM broadcast_outbox
+            WHERE campaign_id = %s
+              AND ((status IN ('pending', 'retry') AND next_attempt_at <= CURRENT_TIMESTAMP)
+                   OR (status = 'sending' AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'))
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING o.id, o.channel, o.recipient, o.attempts
+    ''', (campaign_id, STALE_LOCK, BATCH_SIZE))
+    return cur.fetchall()
+
+
+def _failure(row, error: str, retryable: bool, delay: int = None):
+    if retryable and row['attempts'] < MAX_ATTEMPTS:
+        # Экспоненциальная пауза между попытками
+        return (row['id'], 'retry', error, delay or RETRY_DELAY * 2 ** (row['attempts'] - 1))
+    return (row['id'], 'failed', error, 0)
+
+
+def _telegram_result(row, future):
+    try:
+        future.result()
+        return (row['id'], 'sent', None, 0)
+    except TelegramError as e:
+        if e.code == 403:
+            # Пользователь заблокировал бота или удалил аккаунт — больше не пишем
+            return (row['id'], 'blocked', str(e), 0)
+        if e.code == 429:
+            return _failure(row, str(e), True, int(e.retry_after or RETRY_DELAY))
+        return _failure(row, str(e), e.code is None or e.code >= 500)
+    except Exception as e:
+        return _failure(row, str(e), True)
+
+
+def _send_email(smtp, recipient: str, subject: str, text: str):
+    message = EmailMessage()
+    message['From'] = SMTP_FROM
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.set_content(text)
+    smtp.send_message(message)
+
+
+def reserve_slots(cur, channel: str, count: int) -> float:
+    '''Занять count слотов канала в общем расписании; вернуть паузу в секундах до первого из них'''
+    cur.execute('''
+        INSERT INTO broadcast_rate_limits AS r (channel, next_slot_at)
+        VALUES (%(channel)s, clock_timestamp() + %(span)s * INTERVAL '1 second')
+        ON CONFLICT (channel) DO UPDATE
+        SET next_slot_at = GREATEST(r.next_slot_at, clock_timestamp()) + %(span)s * INTERVAL '1 second'
+        RETURNING EXTRACT(EPOCH FROM r.next_slot_at - clock_timestamp()) - %(span)s AS delay
+    ''', {'channel': channel, 'span': count / RATES[channel]})
+    return max(0.0, float(cur.fetchone()['delay']))
+
+
+def deliver_batch(rows: list, campaign: dict, bot_token: str, delays: dict) -> list:
+    '''Отправить порцию в занятые слоты; вернуть (id, статус, ошибка, пауза) по каждой строке'''
+    results = []
+    pending = []
+    smtp = None
+    started = time.monotonic()
+    sent = Counter()
+    try:
+        for row in rows:
+            # Сообщения канала идут равномерно с его скоростью, начиная с первого занятого слота
+            channel = row['channel']
+            pause = started + delays.get(channel, 0) + sent[channel] / RATES[channel] - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            sent[channel] += 1
+            if row['channel'] == 'telegram':
+                if not bot_token:
+                    results.append(_failure(row, 'Bot token not configured', True))
+                    continue
+                pending.append((row, send_message_async(bot_token, row['recipient'], campaign['message_text'])))
+                continue
+
+            try:
+                if smtp is None:
+                    smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=10)
+                    if SMTP_USER:
+                        smtp.login(SMTP_USER, SMTP_PASSWORD)
+                _send_email(smtp, row['recipient'], campaign['email_subject'] or campaign['title'] or '', campaign['message_text'])
+                results.append((row['id'], 'sent', None, 0))
+            except smtplib.SMTPRecipientsRefused as e:
+                results.append(_failure(row, str(e), False))
+            except Exception as e:
+                smtp = None
+                results.append(_failure(row, str(e), True))
+    finally:
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+
+    results.extend(_telegram_result(row, future) for row, future in pending)
+    return results
+
+
+def record_results(cur, rows: list, results: list):
+    '''Записать итоги порции одним UPDATE и пометить заблокировавших бота'''
+    execute_values(cur, '''
+        UPDATE broadcast_outbox o
+        SET status = v.status,
+            last_error = v.error,
+            next_attempt_at = CURRENT_TIMESTAMP + v.delay * INTERVAL '1 second',
+            sent_at = CASE WHEN v.status = 'sent' THEN CURRENT_TIMESTAMP END,
+            locked_at = NULL
+        FROM (VALUES %s) AS v(id, status, error, delay)
+        WHERE o.id = v.id
+    ''', results, template='(%s::bigint, %s, %s::text, %s::int)')
+
+    recipients = {row['id']: row['recipient'] for row in rows}
+    blocked = [(recipients[result[0]],) for result in results if result[1] == 'blocked']
+    if blocked:
+        execute_values(cur, '''
+            INSERT INTO telegram_blocked_users (telegram_user_id) VALUES %s
+            ON CONFLICT DO NOTHING
+        ''', blocked)
+
+
+def run_campaign(conn, cur, campaign_id: int, bot_token: str) -> dict:
+    '''Разбирать очередь кампании порциями, пока не кончится время или получатели'''
+    started = time.monotonic()
+    processed = 0
+
+    while time.monotonic() - started < TIME_BUDGET:
+        cur.execute('SELECT id, title, message_text, email_subject, status FROM broadcast_campaigns WHERE id = %s', (campaign_id,))
+        campaign = cur.fetchone()
+        if not campaign or campaign['status'] != 'running':
+            conn.commit()
+            break
+
+        rows = claim_batch(cur, campaign_id)
+        # Захват фиксируется сразу: отправка идёт без открытой транзакции и блокировок
+        conn.commit()
+        if not rows:
+            cur.execute('''
+                UPDATE broadcast_campaigns SET status = 'completed', updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'running'
+                  AND NOT EXISTS (
+                      SELECT 1 FROM broadcast_outbox
+                      WHERE campaign_id = %s AND status IN ('pending', 'retry', 'sending')
+                  )
+            ''', (campaign_id, campaign_id))
+            conn.commit()
+            break
+
+        delays = {
+            channel: reserve_slots(cur, channel, count)
+            for channel, count in Counter(row['channel'] for row in rows).items()
+        }
+        conn.commit()
+        results = deliver_batch(rows, campaign, bot_token, delays)
+        record_results(cur, rows, results)
+        conn.commit()
+        processed += len(rows)
+
+    return {'campaign_id': campaign_id, 'processed': processed, 'campaigns': campaign_status(cur, campaign_id)}
@@ -1,83 +1,198 @@
 import json
 import os
-import psycopg2
+import sys
+import time
 from psycopg2.extras import RealDictCursor
-import urllib.request
+from db import get_connection, release_connection
+from telegram import send_message_async, call_api, get_updates, TelegramError
+import broadcast
+from pricing import price_cart, price_carts, MAX_CARTS
+import updates
+from compression import with_compression
+
+# Настройки и шаблоны бота в тёплом инстансе; bot_config_version сверяется не чаще раза в BOT_CONFIG_TTL секунд
+_config_cache = {'version': None, 'settings': {}, 'messages': {}, 'checked_at': None}
+BOT_CONFIG_TTL = float(os.environ.get('BOT_CONFIG_TTL', '30'))
+
+UPDATE_WORKER_BUDGET = float(os.environ.get('TELEGRAM_UPDATE_WORKER_BUDGET', '20'))
+# Webhook разбирает очередь сам, пока Telegram ждёт ответа: после ответа инстанс замораживается
+WEBHOOK_BUDGET = float(os.environ.get('TELEGRAM_WEBHOOK_BUDGET', '5'))
 
 def get_bot_config(cur):
     '''Получить настройки и сообщения бота из БД'''
+    checked_at = _config_cache['checked_at']
+    if checked_at is not None and time.monotonic() - checked_at < BOT_CONFIG_TTL:
+        return _config_cache['settings'], _config_cache['messages']
+    
+    cur.execute('SELECT version FROM bot_config_version WHERE id = 1')
+    row = cur.fetchone()
+    version = row['version'] if row else None
+    
+    if version is not None and version == _config_cache['version']:
+        _config_cache['checked_at'] = time.monotonic()
+        return _config_cache['settings'], _config_cache['messages']
+    
     cur.execute('SELECT setting_key, setting_value FROM bot_settings')
     settings = {row['setting_key']: row['setting_value'] for row in cur.fetchall()}
     
     cur.execute('SELECT message_key, message_text FROM bot_messages')
     messages = {row['message_key']: row['message_text'] for row in cur.fetchall()}
     
+    _config_cache.update(version=version, settings=settings, messages=messages, checked_at=time.monotonic())
     return settings, messages
 
-def send_telegram_message(bot_token: str, chat_id: str, text: str, reply_markup=None):
-    '''Отправить сообщение через Telegram Bot API'''
-    url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-    
-    data = {
-        'chat_id': chat_id,
-        'text': text,
-        'parse_mode': 'HTML'
+def bump_config_version(cur):
+    '''Сбросить кэш настроек: в этом инстансе сразу, в остальных — по истечении BOT_CONFIG_TTL'''
+    cur.execute('UPDATE bot_config_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1')
+    _config_cache['checked_at'] = None
+
+def upsert_values(cur, table: str, key_column: str, value_column: str, values: dict) -> dict:
+    '''Сохранить пары ключ-значение одним запросом; вернуть изменённые и добавленные ключи'''
+    if not values:
+        return {'updated': [], 'created': []}
+    cur.execute(f'''
+        INSERT INTO {table} ({key_column}, {value_column})
+        SELECT * FROM UNNEST(%s::varchar[], %s::text[])
+        ON CONFLICT ({key_column}) DO UPDATE
+        SET {value_column} = EXCLUDED.{value_column}, updated_at = CURRENT_TIMESTAMP
+        WHERE {table}.{value_column} IS DISTINCT FROM EXCLUDED.{value_column}
+        RETURNING {key_column} AS key, (xmax = 0) AS inserted
+    ''', (list(values.keys()), [str(value) for value in values.values()]))
+    changed = cur.fetchall()
+    return {
+        'updated': [row['key'] for row in changed if not row['inserted']],
+        'created': [row['key'] for row in changed if row['inserted']]
     }
-    
-    if reply_markup:
-        data['reply_markup'] = json.dumps(reply_markup)
-    
-    req = urllib.request.Request(
-        url,
-        data=json.dumps(data).encode('utf-8'),
-        headers={'Content-Type': 'application/json'}
-    )
-    
-    with urllib.request.urlopen(req) as response:
-        return json.loads(response.read().decode('utf-8'))
 
 def get_products_list(cur):
     '''Получить список продуктов по категориям'''
     cur.execute('''
-        SELECT category, COUNT(*) as count 
-        FROM products 
-        WHERE in_stock = true 
-        GROUP BY category
+        SELECT category, in_stock_count as count, min_price, new_count
+        FROM category_summary
+        WHERE in_stock_count > 0
+        ORDER BY category
     ''')
     return cur.fetchall()
 
-def get_cart_items(cur, cart_id: int):
-    '''Получить товары из корзины'''
-    cur.execute('''
-        SELECT product_name, product_price, quantity, 
-               (product_price * quantity) as total
-        FROM cart_items 
-        WHERE cart_id = %s AND quantity > 0
-    ''', (cart_id,))
-    return cur.fetchall()
-
-def handle_webhook(event: dict, cur, conn):
-    '''Обработка webhook от Telegram'''
-    settings, messages = get_bot_config(cur)
-    
-    if settings.get('bot_enabled') != 'true':
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'status': 'bot disabled'}),
-            'isBase64Encoded': False
-        }
-    
-    bot_token = settings.get('bot_token', '')
-    if not bot_token:
+def handle_webhook(event: dict):
+    '''Webhook от Telegram: записать update в очередь и разобрать её в пределах WEBHOOK_BUDGET'''
+    update = json.loads(event.get('body') or '{}')
+    if 'update_id' not in update:
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Bot token not configured'}),
+            'body': json.dumps({'error': 'update_id is required'}),
             'isBase64Encoded': False
         }
     
-    update = json.loads(event.get('body', '{}'))
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            settings, _ = get_bot_config(cur)
+            if settings.get('bot_enabled') != 'true':
+                conn.commit()
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'status': 'bot disabled'}),
+                    'isBase64Encoded': False
+                }
+            # Повторная доставка того же update_id отбрасывается здесь
+            enqueued = updates.enqueue_update(cur, update)
+        conn.commit()
+    finally:
+        release_connection(conn)
+    
+    # Ошибка разбора не должна вернуть Telegram не-200: update уже в очереди и будет повторён
+    try:
+        result = process_updates(WEBHOOK_BUDGET) if enqueued else {}
+    except Exception as e:
+        result = {'error': str(e)}
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'ok': True, 'duplicate': not enqueued, **result}),
+        'isBase64Encoded': False
+    }
+
+def process_updates(time_budget: float) -> dict:
+    '''Обработать очередь update; параллельные воркеры не берут одни и те же строки.
+
+    Срок проверяется перед каждым update: не начатые возвращаются в очередь.
+    Update получает done только после того, как Telegram принял все его ответы;
+    недоставленные ответы повторяются с паузой, после updates.MAX_ATTEMPTS
+    update остаётся в статусе failed.
+    '''
+    deadline = time.monotonic() + time_budget
+    processed = 0
+    failed = 0
+    
+    while time.monotonic() < deadline:
+        conn = get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                settings, messages = get_bot_config(cur)
+                bot_token = settings.get('bot_token', '')
+                if not bot_token:
+                    conn.commit()
+                    break
+                
+                claimed = updates.claim_updates(cur)
+                conn.commit()
+                if not claimed:
+                    break
+                
+                for index, row in enumerate(claimed):
+                    if time.monotonic() >= deadline:
+                        updates.release_updates(cur, [r['update_id'] for r in claimed[index:]])
+                        conn.commit()
+                        break
+                    result = process_update(conn, cur, row, bot_token, settings, messages)
+                    updates.record_results(cur, [result])
+                    conn.commit()
+                    if result[1] == 'done':
+                        processed += 1
+                    elif result[1] == 'failed':
+                        failed += 1
+        finally:
+            release_connection(conn)
+    
+    return {'processed': processed, 'failed': failed}
+
+def process_update(conn, cur, row, bot_token: str, settings: dict, messages: dict) -> tuple:
+    '''Собрать ответы на update (при первой попытке) и отправить недоставленные'''
+    replies = row['replies']
+    if replies is None:
+        try:
+            replies = collect_replies(row['payload'], cur, settings, messages)
+        except Exception as e:
+            # Ошибка в самом разборе при повторе не исчезнет
+            conn.rollback()
+            return updates.result_for(row, [], str(e))
+        updates.save_replies(cur, row['update_id'], replies)
+        conn.commit()
+    
+    # Отправка без открытой транзакции: строка уже помечена processing
+    futures = [(reply, send_message_async(bot_token, *reply)) for reply in replies]
+    remaining = []
+    errors = []
+    for reply, future in futures:
+        try:
+            future.result()
+        except TelegramError as e:
+            errors.append(str(e))
+            # 4xx, кроме 429, — окончательный отказ: чат недоступен или сообщение некорректно
+            if e.code is None or e.code == 429 or e.code >= 500:
+                remaining.append(reply)
+        except Exception as e:
+            errors.append(str(e))
+            remaining.append(reply)
+    return updates.result_for(row, remaining, '; '.join(errors) if errors else None)
+
+def collect_replies(update: dict, cur, settings: dict, messages: dict) -> list:
+    '''Разобрать update и подготовить исходящие сообщения'''
+    outbox = []
     
     if 'message' in update:
         message = update['message']
@@ -88,16 +203,17 @@ def handle_webhook(event: dict, cur, conn):
             parts = text.split('_')
             if len(parts) > 1 and parts[0] == '/start order':
                 cart_id = int(parts[1])
-                items = get_cart_items(cur, cart_id)
+                cart_pricing = price_cart(cur, cart_id)
                 
-                if items:
+                if cart_pricing and cart_pricing['items']:
                     order_text = "🛒 <b>Ваш заказ:</b>\n\n"
-                    total = 0
-                    for item in items:
-                        order_text += f"• {item['product_name']} x{item['quantity']} = {item['total']}₽\n"
-                        total += item['total']
+                    for item in cart_pricing['items']:
+                        discount = f" (−{item['discount_percent']}%)" if item['discount_percent'] else ''
+                        order_text += f"• {item['product_name']} x{item['quantity']} = {item['total']}₽{discount}\n"
                     
-                    order_text += f"\n💰 <b>Итого: {total}₽</b>\n\n"
+                    if cart_pricing['discount_total']:
+                        order_text += f"\n🎁 Скидка: {cart_pricing['discount_total']}₽"
+                    order_text += f"\n💰 <b>Итого: {cart_pricing['total']}₽</b>\n\n"
                     order_text += "Для оформления заказа свяжитесь с менеджером"
                     
                     keyboard = {
@@ -106,26 +222,25 @@ def handle_webhook(event: dict, cur, conn):
                         ]
                     }
                     
-                    send_telegram_message(bot_token, chat_id, order_text, keyboard)
+                    outbox.append((chat_id, order_text, keyboard))
                     
                     cur.execute('UPDATE carts SET telegram_user_id = %s WHERE id = %s', (str(chat_id), cart_id))
-                    conn.commit()
                 else:
-                    send_telegram_message(bot_token, chat_id, "Корзина пуста")
+                    outbox.append((chat_id, "Корзина пуста"))
             else:
                 welcome_text = messages.get('welcome', 'Привет!')
-                send_telegram_message(bot_token, chat_id, welcome_text)
+                outbox.append((chat_id, welcome_text))
         
         elif text == '/help':
             help_text = messages.get('help', 'Доступные команды:\n/start\n/catalog\n/help')
-            send_telegram_message(bot_token, chat_id, help_text)
+            outbox.append((chat_id, help_text))
         
         elif text == '/catalog':
             products = get_products_list(cur)
             
             catalog_text = messages.get('catalog_intro', '📦 Наш каталог:') + '\n\n'
             for product in products:
-                catalog_text += f"• {product['category']}: {product['count']} товаров\n"
+                catalog_text += f"• {product['category']}: {product['count']} товаров, от {product['min_price']}₽\n"
             
             keyboard = {
                 'inline_keyboard': [
@@ -133,27 +248,78 @@ def handle_webhook(event: dict, cur, conn):
                 ]
             }
             
-            send_telegram_message(bot_token, chat_id, catalog_text, keyboard)
+            outbox.append((chat_id, catalog_text, keyboard))
         
         else:
-            send_telegram_message(bot_token, chat_id, 'Используйте /help для списка команд')
+            outbox.append((chat_id, 'Используйте /help для списка команд'))
         
         admin_chat_id = settings.get('admin_chat_id', '')
         if admin_chat_id:
             admin_text = f"💬 Новое сообщение от пользователя {chat_id}:\n{text}"
-            send_telegram_message(bot_token, admin_chat_id, admin_text)
+            outbox.append((admin_chat_id, admin_text))
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json'},
-        'body': json.dumps({'ok': True}),
-        'isBase64Encoded': False
-    }
+    return outbox
+
+def handle_broadcast(event: dict, method: str, path: str, params: dict):
+    '''Рассылки: создание, запуск порции, пауза/возобновление и статус'''
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            body = json.loads(event.get('body') or '{}') if method == 'POST' else {}
+            campaign_id = body.get('campaign_id') or params.get('campaign_id')
+            campaign_id = int(campaign_id) if campaign_id else None
+            
+            if method == 'GET' and path == 'broadcast-status':
+                result = {'campaigns': broadcast.campaign_status(cur, campaign_id)}
+                conn.commit()
+            elif method == 'POST' and path == 'broadcast':
+                if not body.get('text'):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'text is required'}),
+                        'isBase64Encoded': False
+                    }
+                result = broadcast.create_campaign(cur, body['text'], body.get('title'), body.get('subject'), body.get('channels'))
+                conn.commit()
+            elif method == 'POST' and path in ('broadcast-pause', 'broadcast-resume') and campaign_id:
+                status = 'paused' if path == 'broadcast-pause' else 'running'
+                result = {'success': broadcast.set_campaign_state(cur, campaign_id, status)}
+                conn.commit()
+            elif method == 'POST' and path == 'broadcast-run':
+                if campaign_id is None:
+                    cur.execute("SELECT id FROM broadcast_campaigns WHERE status = 'running' ORDER BY id LIMIT 1")
+                    row = cur.fetchone()
+                    campaign_id = row['id'] if row else None
+                if campaign_id is None:
+                    result = {'processed': 0, 'campaigns': []}
+                else:
+                    settings, _ = get_bot_config(cur)
+                    result = broadcast.run_campaign(conn, cur, campaign_id, settings.get('bot_token', ''))
+                conn.commit()
+            else:
+                return {
+                    'statusCode': 405,
+                    'headers': {'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Method not allowed'}),
+                    'isBase64Encoded': False
+                }
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result, ensure_ascii=False, default=str),
+            'isBase64Encoded': False
+        }
+    finally:
+        release_connection(conn)
 
+@with_compression
 def handler(event: dict, context) -> dict:
     '''API для управления настройками телеграм-бота и webhook для приема сообщений'''
     method = event.get('httpMethod', 'GET')
-    path = event.get('queryStringParameters', {}).get('action', '')
+    params = event.get('queryStringParameters') or {}
+    path = params.get('action', '')
     
     if method == 'OPTIONS':
         return {
@@ -169,17 +335,60 @@ def handler(event: dict, context) -> dict:
     
     conn = None
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        if not dsn:
-            raise Exception('DATABASE_URL not configured')
+        if path.startswith('broadcast'):
+            return handle_broadcast(event, method, path, params)
+        
+        if path == 'cart-pricing' and method == 'GET':
+            # Единый расчёт итогов для бота, витрины и оформления заказа
+            conn = get_connection()
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                raw_ids = params.get('cart_ids') or params.get('cart_id') or ''
+                try:
+                    cart_ids = [int(cart_id) for cart_id in raw_ids.split(',') if cart_id.strip()]
+                    if not cart_ids and params.get('status'):
+                        # Отчёт по всем корзинам в статусе
+                        cur.execute('SELECT id FROM carts WHERE status = %s ORDER BY id DESC LIMIT %s', (params['status'], MAX_CARTS))
+                        cart_ids = [row['id'] for row in cur.fetchall()]
+                    carts = price_carts(cur, cart_ids)
+                except ValueError as e:
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+            conn.commit()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'carts': [carts[cart_id] for cart_id in sorted(carts)]}, ensure_ascii=False, default=str),
+                'isBase64Encoded': False
+            }
+        
+        if path == 'process-updates':
+            # Досбор очереди по расписанию: повторы и то, что не уложилось в бюджет webhook
+            result = process_updates(UPDATE_WORKER_BUDGET) if method == 'POST' else {}
+            conn = get_connection()
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if method == 'POST':
+                    result['purged'] = updates.purge_processed(cur)
+                result['queue'] = updates.queue_stats(cur)
+            conn.commit()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result),
+                'isBase64Encoded': False
+            }
         
-        conn = psycopg2.connect(dsn)
+        if method == 'POST' and path != 'webhook':
+            return handle_webhook(event)
+        
+        conn = get_connection()
         
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             
-            if method == 'POST' and path != 'webhook':
-                return handle_webhook(event, cur, conn)
-            
             if method == 'GET':
                 cur.execute('SELECT * FROM bot_settings ORDER BY setting_key')
                 settings = cur.fetchall()
@@ -202,25 +411,14 @@ def handler(event: dict, context) -> dict:
             
             elif method == 'PUT':
                 body = json.loads(event.get('body', '{}'))
-                settings = body.get('settings', [])
-                messages = body.get('messages', [])
-                
-                for setting in settings:
-                    cur.execute(
-                        '''UPDATE bot_settings 
-                           SET setting_value = %s, updated_at = CURRENT_TIMESTAMP 
-                           WHERE setting_key = %s''',
-                        (setting['setting_value'], setting['setting_key'])
-                    )
+                settings = {item['setting_key']: item['setting_value'] for item in body.get('settings', [])}
+                messages = {item['message_key']: item['message_text'] for item in body.get('messages', [])}
                 
-                for message in messages:
-                    cur.execute(
-                        '''UPDATE bot_messages 
-                           SET message_text = %s, updated_at = CURRENT_TIMESTAMP 
-                           WHERE message_key = %s''',
-                        (message['message_text'], message['message_key'])
-                    )
+                changed_settings = upsert_values(cur, 'bot_settings', 'setting_key', 'setting_value', settings)
+                changed_messages = upsert_values(cur, 'bot_messages', 'message_key', 'message_text', messages)
                 
+                if any(changed_settings.values()) or any(changed_messages.values()):
+                    bump_config_version(cur)
                 conn.commit()
                 
                 return {
@@ -229,7 +427,11 @@ def handler(event: dict, context) -> dict:
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'success': True}),
+                    'body': json.dumps({
+                        'success': True,
+                        'settings': changed_settings,
+                        'messages': changed_messages
+                    }, ensure_ascii=False),
                     'isBase64Encoded': False
                 }
             
@@ -251,5 +453,28 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        release_connection(conn)
+
+def poll_updates():
+    '''Локальный режим без webhook: getUpdates -> та же очередь -> тот же воркер'''
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            settings, _ = get_bot_config(cur)
+        conn.commit()
+    finally:
+        release_connection(conn)
+    
+    bot_token = settings.get('bot_token', '')
+    # getUpdates не работает, пока у бота установлен webhook
+    call_api(bot_token, 'deleteWebhook', {'drop_pending_updates': False})
+    
+    offset = None
+    while True:
+        batch = get_updates(bot_token, offset)
+        for update in batch:
+            handle_webhook({'body': json.dumps(update)})
+            offset = update['update_id'] + 1
+
+if __name__ == '__main__' and '--poll' in sys.argv:
+    poll_updates()
@@ -0,0 +1,97 @@
+MAX_CARTS = 500
+
+# Цена позиции: текущая цена товара (снимок из cart_items, если товар удалён),
+# скидка — наибольшая из скидки товара и действующих акций на его категорию или на весь магазин;
+# expires_at — самое раннее окончание акций, которые могли повлиять на строку
+PRICE_CARTS_SQL = '''
+    WITH version AS (
+        SELECT version FROM pricing_version WHERE id = 1
+    ),
+    promo AS (
+        SELECT category, MAX(percent_off) AS percent_off, MIN(ends_at) AS ends_at
+        FROM promotions
+        WHERE is_active AND percent_off > 0
+          AND (ends_at IS NULL OR ends_at > CURRENT_TIMESTAMP)
+        GROUP BY category
+    ),
+    lines AS (
+        SELECT ci.cart_id, ci.product_id, ci.quantity,
+               COALESCE(p.name, ci.product_name) AS product_name,
+               COALESCE(p.price, ci.product_price) AS unit_price,
+               LEAST(100, GREATEST(
+                   COALESCE(p.discount, 0),
+                   COALESCE(pc.percent_off, 0),
+                   COALESCE(pa.percent_off, 0)
+               )) AS discount_percent,
+               LEAST(pc.ends_at, pa.ends_at) AS expires_at
+        FROM cart_items ci
+        LEFT JOIN products p ON p.id = ci.product_id
+        LEFT JOIN promo pc ON pc.category = p.category
+        LEFT JOIN promo pa ON pa.category IS NULL
+        WHERE ci.cart_id = ANY(%(ids)s) AND ci.quantity > 0
+    ),
+    priced AS (
+        SELECT *, ROUND(unit_price * (100 - discount_percent) / 100.0, 2) AS final_price
+        FROM lines
+    )
+    INSERT INTO cart_pricing (cart_id, cart_version, pricing_version, items, subtotal, discount_total, total, expires_at, computed_at)
+    SELECT c.id, c.version, (SELECT version FROM version),
+           COALESCE(jsonb_agg(jsonb_build_object(
+               'product_id', l.product_id,
+               'product_name', l.product_name,
+               'quantity', l.quantity,
+               'unit_price', l.unit_price,
+               'discount_percent', l.discount_percent,
+               'final_price', l.final_price,
+               'total', l.final_price * l.quantity
+           ) ORDER BY l.product_name) FILTER (WHERE l.cart_id IS NOT NULL), '[]'::jsonb),
+           COALESCE(SUM(l.unit_price * l.quantity), 0),
+           COALESCE(SUM((l.unit_price - l.final_price) * l.quantity), 0),
+           COALESCE(SUM(l.final_price * l.quantity), 0),
+           MIN(l.expires_at),
+           CURRENT_TIMESTAMP
+    FROM carts c
+    LEFT JOIN priced l ON l.cart_id = c.id
+    WHERE c.id = ANY(%(ids)s)
+    GROUP BY c.id
+    ON CONFLICT (cart_id) DO UPDATE
+    SET cart_version = EXCLUDED.cart_version,
+        pricing_version = EXCLUDED.pricing_version,
+        items = EXCLUDED.items,
+        subtotal = EXCLUDED.subtotal,
+        discount_total = EXCLUDED.discount_total,
+        total = EXCLUDED.total,
+        expires_at = EXCLUDED.expires_at,
+        computed_at = EXCLUDED.computed_at
+    RETURNING cart_id, cart_version, pricing_version, items, subtotal, discount_total, total
+'''
+
+
+def price_carts(cur, cart_ids: list) -> dict:
+    '''Итоги нескольких корзин: актуальные берутся из cart_pricing, остальные считаются одним запросом'''
+    cart_ids = sorted({int(cart_id) for cart_id in cart_ids})
+    if not cart_ids:
+        return {}
+    if len(cart_ids) > MAX_CARTS:
+        raise ValueError(f'Не больше {MAX_CARTS} корзин за запрос')
+
+    cur.execute('''
+        SELECT cp.cart_id, cp.cart_version, cp.pricing_version, cp.items, cp.subtotal, cp.discount_total, cp.total
+        FROM carts c
+        JOIN cart_pricing cp ON cp.cart_id = c.id AND cp.cart_version = c.version
+        WHERE c.id = ANY(%s)
+          AND cp.pricing_version = (SELECT version FROM pricing_version WHERE id = 1)
+          AND (cp.expires_at IS NULL OR cp.expires_at > CURRENT_TIMESTAMP)
+    ''', (cart_ids,))
+    result = {row['cart_id']: dict(row) for row in cur.fetchall()}
+
+    stale = [cart_id for cart_id in cart_ids if cart_id not in result]
+    if stale:
+        cur.execute(PRICE_CARTS_SQL, {'ids': stale})
+        result.update((row['cart_id'], dict(row)) for row in cur.fetchall())
+    return result
+
+
+def price_cart(cur, cart_id: int):
+    '''Итог одной корзины или None, если корзины нет'''
+    return price_carts(cur, [cart_id]).get(int(cart_id))
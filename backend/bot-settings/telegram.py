@@ -0,0 +1,130 @@
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Адрес Bot API можно подменить на локальный фейковый сервер для тестов
+API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+TIMEOUT = float(os.environ.get('TELEGRAM_TIMEOUT', '5'))
+MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', '3'))
+MAX_RETRY_AFTER = float(os.environ.get('TELEGRAM_MAX_RETRY_AFTER', '5'))
+
+_local = threading.local()
+# Потоки живут между тёплыми вызовами, вместе с ними — их keep-alive соединения
+_executor = ThreadPoolExecutor(max_workers=4)
+
+
+class TelegramError(Exception):
+    def __init__(self, message: str, code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.code = code
+        self.retry_after = retry_after
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        parts = urlsplit(API_URL)
+        conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        conn = conn_class(parts.netloc, timeout=TIMEOUT)
+        _local.conn = conn
+    return conn
+
+
+def _reset_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+    _local.conn = None
+
+
+def call_api(bot_token: str, method: str, payload: dict) -> dict:
+    '''Вызов Bot API по keep-alive соединению с учётом retry_after на 429'''
+    path = urlsplit(API_URL).path.rstrip('/') + f'/bot{bot_token}/{method}'
+    body = json.dumps(payload).encode('utf-8')
+
+    for attempt in range(MAX_RETRIES + 1):
+        # Повторяется только запрос, который сервер заведомо не обработал: устаревшее
+        # keep-alive соединение оборвалось при отправке или закрылось, не начав ответ
+        reused = getattr(_local, 'conn', None) is not None
+        try:
+            conn = _connection()
+            conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+        except (http.client.CannotSendRequest, BrokenPipeError, ConnectionResetError):
+            _reset_connection()
+            if not reused or attempt == MAX_RETRIES:
+                raise
+            continue
+        except (http.client.HTTPException, OSError):
+            _reset_connection()
+            raise
+        try:
+            response = conn.getresponse()
+        except http.client.RemoteDisconnected:
+            _reset_connection()
+            if not reused or attempt == MAX_RETRIES:
+                raise
+            continue
+        except (http.client.HTTPException, OSError):
+            # Таймаут ожидания ответа: сообщение могло уйти, повтор дал бы дубль
+            _reset_connection()
+            raise
+        try:
+            result = json.loads(response.read().decode('utf-8') or '{}')
+        except (http.client.HTTPException, OSError, ValueError):
+            _reset_connection()
+            raise
+
+        if response.status == 429:
+            retry_after = float((result.get('parameters') or {}).get('retry_after', 1))
+            if attempt == MAX_RETRIES or retry_after > MAX_RETRY_AFTER:
+                raise TelegramError(f'Too many requests, retry after {retry_after}s', 429, retry_after)
+            time.sleep(retry_after)
+            continue
+
+        if not result.get('ok'):
+            raise TelegramError(result.get('description') or f'HTTP {response.status}', result.get('error_code') or response.status)
+        return result
+
+    raise TelegramError('Telegram API is unavailable')
+
+
+def send_telegram_message(bot_token: str, chat_id: str, text: str, reply_markup=None):
+    '''Отправить сообщение через Telegram Bot API'''
+    data = {
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': 'HTML'
+    }
+
+    if reply_markup:
+        data['reply_markup'] = json.dumps(reply_markup)
+
+    return call_api(bot_token, 'sendMessage', data)
+
+
+def send_message_async(bot_token: str, chat_id: str, text: str, reply_markup=None):
+    '''Поставить отправку в общий пул потоков; возвращает Future'''
+    return _executor.submit(send_telegram_message, bot_token, chat_id, text, reply_markup)
+
+
+def get_updates(bot_token: str, offset: int = None, timeout: int = 25) -> list:
+    '''Long polling через getUpdates — для локальной отладки без webhook'''
+    payload = {'timeout': timeout, 'allowed_updates': ['message']}
+    if offset is not None:
+        payload['offset'] = offset
+    request = urllib.request.Request(
+        API_URL.rstrip('/') + f'/bot{bot_token}/getUpdates',
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+    # Отдельное соединение: ответ ждёт до timeout секунд, общий TIMEOUT для этого мал
+    with urllib.request.urlopen(request, timeout=timeout + 10) as response:
+        result = json.loads(response.read().decode('utf-8'))
+    if not result.get('ok'):
+        raise TelegramError(result.get('description') or 'getUpdates failed', result.get('error_code'))
+    return result['result']
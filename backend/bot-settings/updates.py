@@ -0,0 +1,101 @@
+import json
+import os
+from psycopg2.extras import execute_values
+
+BATCH_SIZE = int(os.environ.get('TELEGRAM_UPDATES_BATCH_SIZE', '20'))
+RETENTION_DAYS = int(os.environ.get('TELEGRAM_UPDATES_RETENTION_DAYS', '7'))
+MAX_ATTEMPTS = int(os.environ.get('TELEGRAM_UPDATES_MAX_ATTEMPTS', '5'))
+RETRY_DELAY = int(os.environ.get('TELEGRAM_UPDATES_RETRY_DELAY', '10'))
+# Строки в статусе processing дольше этого времени брошены упавшим или замороженным инстансом
+STALE_LOCK = int(os.environ.get('TELEGRAM_UPDATES_STALE_LOCK', '120'))
+
+
+def enqueue_update(cur, update: dict) -> bool:
+    '''Записать update в очередь; False, если Telegram прислал его повторно'''
+    cur.execute('''
+        INSERT INTO telegram_updates (update_id, payload) VALUES (%s, %s)
+        ON CONFLICT (update_id) DO NOTHING
+    ''', (update['update_id'], json.dumps(update, ensure_ascii=False)))
+    return cur.rowcount > 0
+
+
+def claim_updates(cur) -> list:
+    '''Захватить порцию update; параллельные воркеры пропускают чужие строки'''
+    cur.execute('''
+        UPDATE telegram_updates u
+        SET status = 'processing', attempts = u.attempts + 1, locked_at = CURRENT_TIMESTAMP
+        WHERE u.update_id IN (
+            SELECT update_id FROM telegram_updates
+            WHERE (status IN ('pending', 'retry') AND next_attempt_at <= CURRENT_TIMESTAMP)
+               OR (status = 'processing' AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+            ORDER BY update_id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING u.update_id, u.payload, u.attempts, u.replies
+    ''', (STALE_LOCK, BATCH_SIZE))
+    return sorted(cur.fetchall(), key=lambda row: row['update_id'])
+
+
+def release_updates(cur, update_ids: list):
+    '''Вернуть в очередь захваченные, но не начатые update, не тратя их попытку'''
+    if update_ids:
+        cur.execute('''
+            UPDATE telegram_updates
+            SET status = 'pending', attempts = attempts - 1, locked_at = NULL
+            WHERE update_id = ANY(%s) AND status = 'processing'
+        ''', (update_ids,))
+
+
+def save_replies(cur, update_id: int, replies: list):
+    '''Запомнить ответы до отправки, чтобы повтор не собирал и не слал их заново'''
+    cur.execute(
+        'UPDATE telegram_updates SET replies = %s WHERE update_id = %s',
+        (json.dumps(replies, ensure_ascii=False), update_id)
+    )
+
+
+def result_for(row, remaining: list, error: str = None) -> tuple:
+    '''(update_id, статус, ошибка, пауза, недоставленные ответы) для record_results.
+
+    Повторяются только update с недоставленными ответами; ответы, отклонённые
+    окончательно, в remaining не попадают.
+    '''
+    if error is None:
+        return (row['update_id'], 'done', None, 0, '[]')
+    replies = json.dumps(remaining, ensure_ascii=False)
+    if remaining and row['attempts'] < MAX_ATTEMPTS:
+        # Экспоненциальная пауза между попытками
+        return (row['update_id'], 'retry', error, RETRY_DELAY * 2 ** (row['attempts'] - 1), replies)
+    return (row['update_id'], 'failed', error, 0, replies)
+
+
+def record_results(cur, results: list):
+    '''Записать итоги порции одним UPDATE'''
+    if not results:
+        return
+    execute_values(cur, '''
+        UPDATE telegram_updates u
+        SET status = v.status,
+            last_error = v.error,
+            next_attempt_at = CURRENT_TIMESTAMP + v.delay * INTERVAL '1 second',
+            processed_at = CASE WHEN v.status IN ('done', 'failed') THEN CURRENT_TIMESTAMP END,
+            replies = v.replies,
+            locked_at = NULL
+        FROM (VALUES %s) AS v(update_id, status, error, delay, replies)
+        WHERE u.update_id = v.update_id
+    ''', results, template='(%s::bigint, %s, %s::text, %s::int, %s::jsonb)')
+
+
+def queue_stats(cur) -> dict:
+    cur.execute('SELECT status, COUNT(*) AS count FROM telegram_updates GROUP BY status')
+    return {row['status']: row['count'] for row in cur.fetchall()}
+
+
+def purge_processed(cur) -> int:
+    '''Удалить давно обработанные update; повторы старше нескольких дней Telegram не присылает'''
+    cur.execute(
+        "DELETE FROM telegram_updates WHERE processed_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'",
+        (RETENTION_DAYS,)
+    )
+    return cur.rowcount
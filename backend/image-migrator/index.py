@@ -0,0 +1,156 @@
+import json
+import os
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from compression import with_compression
+from storage import store_image
+
+BATCH_SIZE = int(os.environ.get('IMAGE_MIGRATION_BATCH_SIZE', '20'))
+WORKERS = int(os.environ.get('IMAGE_MIGRATION_WORKERS', '4'))
+TIME_BUDGET = float(os.environ.get('IMAGE_MIGRATION_TIME_BUDGET', '20'))
+
+
+def upload_inline_image(data_url: str) -> str:
+    '''Сохранить base64-изображение тем же путём, что и upload-image, и вернуть URL полного варианта'''
+    # Ключ по хэшу содержимого: повторный прогон после сбоя найдёт уже сохранённый манифест
+    return store_image(base64.b64decode(data_url.split(',', 1)[1]))['url']
+
+
+def migrate_batch(conn, cur, schema: str, state: dict):
+    '''Перенести одну порцию строк после last_id; число просмотренных строк или None, если идёт другой прогон'''
+    # Строка состояния заблокирована до commit порции: параллельный прогон не возьмёт тот же чекпойнт
+    cur.execute('''
+        SELECT last_id, migrated_count, failed_count FROM image_migration_state
+        WHERE name = 'products'
+        FOR UPDATE SKIP LOCKED
+    ''')
+    locked = cur.fetchone()
+    if not locked:
+        conn.rollback()
+        return None
+    state.update(locked)
+
+    cur.execute(f'''
+        SELECT id, image_url FROM {schema}.products
+        WHERE has_inline_image AND id > %s
+        ORDER BY id
+        LIMIT %s
+    ''', (state['last_id'], BATCH_SIZE))
+    rows = cur.fetchall()
+    if not rows:
+        conn.commit()
+        return 0
+
+    def process(row):
+        try:
+            return row['id'], upload_inline_image(row['image_url']), None
+        except Exception as e:
+            return row['id'], None, str(e)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(process, rows))
+
+    for product_id, url, error in results:
+        if url:
+            cur.execute(
+                f'UPDATE {schema}.products SET image_url = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s AND has_inline_image',
+                (url, product_id)
+            )
+            state['migrated_count'] += cur.rowcount
+        else:
+            cur.execute('''
+                INSERT INTO image_migration_failures (product_id, error) VALUES (%s, %s)
+                ON CONFLICT (product_id) DO UPDATE SET error = EXCLUDED.error, created_at = CURRENT_TIMESTAMP
+            ''', (product_id, error))
+            state['failed_count'] += 1
+
+    # Чекпойнт фиксируется в той же транзакции, что и новые URL
+    state['last_id'] = rows[-1]['id']
+    cur.execute('''
+        UPDATE image_migration_state
+        SET last_id = %s, migrated_count = %s, failed_count = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE name = 'products'
+    ''', (state['last_id'], state['migrated_count'], state['failed_count']))
+    conn.commit()
+    return len(rows)
+
+
+@with_compression
+def handler(event: dict, context) -> dict:
+    '''Фоновый перенос base64-изображений товаров в объектное хранилище с возобновлением'''
+
+    method = event.get('httpMethod', 'POST')
+    params = event.get('queryStringParameters') or {}
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    conn = None
+    try:
+        conn = get_connection()
+        schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if method == 'POST' and params.get('reset') == 'true':
+                # Начать заново, например чтобы повторить упавшие строки
+                cur.execute("UPDATE image_migration_state SET last_id = 0, failed_count = 0 WHERE name = 'products'")
+                cur.execute('DELETE FROM image_migration_failures')
+                conn.commit()
+
+            cur.execute("SELECT last_id, migrated_count, failed_count FROM image_migration_state WHERE name = 'products'")
+            state = dict(cur.fetchone())
+            conn.commit()
+
+            done = False
+            busy = False
+            if method == 'POST':
+                started = time.monotonic()
+                while time.monotonic() - started < TIME_BUDGET:
+                    scanned = migrate_batch(conn, cur, schema, state)
+                    if scanned is None:
+                        busy = True
+                        break
+                    if scanned == 0:
+                        done = True
+                        break
+
+            cur.execute(f'SELECT COUNT(*) AS remaining FROM {schema}.products WHERE has_inline_image')
+            remaining = cur.fetchone()['remaining']
+            conn.commit()
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({**state, 'remaining': remaining, 'done': done, 'busy': busy}),
+                'isBase64Encoded': False
+            }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        release_connection(conn)
+
+
+if __name__ == '__main__':
+    # Локальный прогон до конца, например против minio/moto через S3_ENDPOINT_URL
+    while True:
+        result = json.loads(handler({'httpMethod': 'POST'}, None)['body'])
+        if 'error' in result or result.get('done') or result.get('busy'):
+            break
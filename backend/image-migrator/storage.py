@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import boto3
+from botocore.exceptions import ClientError
+from variants import build_variants
+
+# Общий модуль хранения изображений: одинаковые копии в upload-image и image-migrator
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev')
+S3_BUCKET = 'files'
+
+_s3 = None
+
+
+def get_s3():
+    '''S3-клиент, один на тёплый инстанс'''
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client('s3',
+            endpoint_url=S3_ENDPOINT_URL,
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+        )
+    return _s3
+
+
+def cdn_url(key: str) -> str:
+    return f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{key}"
+
+
+def store_image(image_data: bytes) -> dict:
+    '''Сохранить варианты изображения под ключом по хэшу содержимого'''
+    digest = hashlib.sha256(image_data).hexdigest()[:32]
+    prefix = f"products/{digest}"
+    manifest_key = f"{prefix}/manifest.json"
+    s3 = get_s3()
+    
+    # Манифест пишется последним, поэтому его наличие означает, что все варианты уже в бакете
+    try:
+        manifest = s3.get_object(Bucket=S3_BUCKET, Key=manifest_key)
+        return {**json.loads(manifest['Body'].read()), 'deduplicated': True}
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+            raise
+    
+    variants, original_ext = build_variants(image_data)
+    urls = {}
+    for variant, extension, mime_type, body in variants:
+        key = f"{prefix}/{variant}.{extension}"
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=key,
+            Body=body,
+            ContentType=mime_type,
+            CacheControl='public, max-age=31536000, immutable'
+        )
+        urls.setdefault(variant, {})[extension] = cdn_url(key)
+    
+    result = {
+        'url': urls['full'][original_ext],
+        'variants': urls,
+        'hash': digest
+    }
+    s3.put_object(
+        Bucket=S3_BUCKET,
+        Key=manifest_key,
+        Body=json.dumps(result).encode('utf-8'),
+        ContentType='application/json'
+    )
+    return {**result, 'deduplicated': False}
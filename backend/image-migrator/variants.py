@@ -0,0 +1,53 @@
+import io
+from PIL import Image, ImageOps
+
+# Максимальная сторона для каждого варианта; меньшие изображения не увеличиваются
+VARIANTS = {
+    'thumb': 150,
+    'card': 400,
+    'full': 1200,
+}
+
+# Формат исходника -> (формат Pillow, расширение, MIME)
+OUTPUT_FORMATS = {
+    'JPEG': ('JPEG', 'jpg', 'image/jpeg'),
+    'PNG': ('PNG', 'png', 'image/png'),
+    'WEBP': ('WEBP', 'webp', 'image/webp'),
+}
+
+WEBP = OUTPUT_FORMATS['WEBP']
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    '''Сохранить без EXIF и прочих метаданных'''
+    out = io.BytesIO()
+    if fmt == 'JPEG':
+        image.convert('RGB').save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+    elif fmt == 'PNG':
+        image.save(out, 'PNG', optimize=True)
+    else:
+        image.save(out, 'WEBP', quality=80, method=4)
+    return out.getvalue()
+
+
+def build_variants(image_data: bytes):
+    '''Вернуть список (вариант, расширение, MIME, байты) для всех размеров в WebP и исходном формате'''
+    with Image.open(io.BytesIO(image_data)) as source:
+        source_format = source.format
+        # Учесть ориентацию из EXIF до того, как метаданные будут отброшены
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+    formats = [WEBP]
+    original = OUTPUT_FORMATS.get(source_format, OUTPUT_FORMATS['PNG'])
+    if original != WEBP:
+        formats.append(original)
+
+    results = []
+    for variant, max_side in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        for fmt, extension, mime_type in formats:
+            results.append((variant, extension, mime_type, _encode(resized, fmt)))
+    return results, original[1]
@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+from psycopg2.extras import RealDictCursor
+
+IMPORT_COLUMNS = (
+    'sku', 'name', 'price', 'category', 'image_url', 'short_description', 'full_description',
+    'features', 'in_stock', 'is_new', 'discount'
+)
+
+EXPORT_BATCH_SIZE = 500
+
+# Артикулы по умолчанию (V0035) генерируются в этом пространстве
+AUTO_SKU_PREFIX = 'AUTO-'
+
+# Маркер NULL для COPY: пустые ячейки прайса означают «не менять»
+COPY_NULL = '\\N'
+
+TRUE_VALUES = ('true', '1', 'yes', 'да')
+FALSE_VALUES = ('false', '0', 'no', 'нет')
+
+
+def parse_rows(body: str, fmt: str):
+    '''Разобрать тело запроса в пары (номер строки, словарь)'''
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(body))
+        for line_no, row in enumerate(reader, start=2):
+            yield line_no, {k.strip(): v for k, v in row.items() if k}
+    else:
+        for line_no, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, row if isinstance(row, dict) else None
+
+
+# Ограничения колонок products: строку, которая их нарушит, лучше отклонить здесь,
+# чем уронить COPY или upsert всего прайса
+MAX_LENGTHS = {'sku': 100, 'name': 255, 'category': 100}
+INT_RANGES = {'price': (0, 2147483647), 'discount': (0, 100)}
+
+
+def _to_int(value, key: str = None):
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'некорректное число: {value}')
+    low, high = INT_RANGES.get(key, (-2147483648, 2147483647))
+    if not low <= number <= high:
+        raise ValueError(f'{key or "число"} вне диапазона {low}..{high}: {value}')
+    return number
+
+
+def _to_bool(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f'некорректное логическое значение: {value}')
+
+
+def normalize_row(row: dict) -> tuple:
+    '''Привести строку прайса к колонкам staging-таблицы; None — «не менять»'''
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise ValueError('не указан sku')
+
+    features = row.get('features')
+    if isinstance(features, str):
+        features = json.loads(features) if features.strip() else None
+    if features is not None and not isinstance(features, dict):
+        raise ValueError('features должен быть объектом')
+
+    def text(key):
+        value = row.get(key)
+        if value is None or value == '':
+            return None
+        value = str(value)
+        if key in MAX_LENGTHS and len(value) > MAX_LENGTHS[key]:
+            raise ValueError(f'{key} длиннее {MAX_LENGTHS[key]} символов')
+        return value
+
+    if len(sku) > MAX_LENGTHS['sku']:
+        raise ValueError(f"sku длиннее {MAX_LENGTHS['sku']} символов")
+
+    return (
+        sku,
+        text('name'),
+        _to_int(row.get('price'), 'price'),
+        text('category'),
+        text('image_url'),
+        text('short_description'),
+        text('full_description'),
+        json.dumps(features, ensure_ascii=False) if features is not None else None,
+        _to_bool(row.get('in_stock')),
+        _to_bool(row.get('is_new')),
+        _to_int(row.get('discount'), 'discount'),
+    )
+
+
+def import_products(conn, schema: str, body: str, fmt: str) -> dict:
+    '''Загрузить прайс через COPY во временную таблицу и слить одним upsert по sku'''
+    errors = []
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    staged = 0
+
+    for line_no, row in parse_rows(body, fmt):
+        if row is None:
+            errors.append({'line': line_no, 'error': 'некорректная строка'})
+            continue
+        try:
+            writer.writerow((line_no,) + tuple(COPY_NULL if v is None else v for v in normalize_row(row)))
+            staged += 1
+        except (ValueError, TypeError) as e:
+            errors.append({'line': line_no, 'sku': row.get('sku'), 'error': str(e)})
+
+    inserted = updated = 0
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if staged:
+            cur.execute('''
+                CREATE TEMP TABLE products_import (
+                    line_no INTEGER, sku VARCHAR(100), name VARCHAR(255), price INTEGER,
+                    category VARCHAR(100), image_url TEXT, short_description TEXT, full_description TEXT,
+                    features JSONB, in_stock BOOLEAN, is_new BOOLEAN, discount INTEGER
+                ) ON COMMIT DROP
+            ''')
+            buffer.seek(0)
+            cur.copy_expert(
+                f"COPY products_import (line_no, {', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                buffer
+            )
+
+            # Новые sku без обязательных полей вставить нельзя — отдаём как ошибки строк
+            cur.execute(f'''
+                DELETE FROM products_import i
+                WHERE (i.name IS NULL OR i.price IS NULL OR i.category IS NULL)
+                  AND NOT EXISTS (SELECT 1 FROM {schema}.products p WHERE p.sku = i.sku)
+                RETURNING line_no, sku
+            ''')
+            for row in cur.fetchall():
+                errors.append({'line': row['line_no'], 'sku': row['sku'], 'error': 'для нового товара нужны name, price и category'})
+
+            # Пространство AUTO- принадлежит артикулам по умолчанию: прайс может обновлять такие товары, но не создавать
+            cur.execute(f'''
+                DELETE FROM products_import i
+                WHERE i.sku LIKE %s
+                  AND NOT EXISTS (SELECT 1 FROM {schema}.products p WHERE p.sku = i.sku)
+                RETURNING line_no, sku
+            ''', (AUTO_SKU_PREFIX + '%',))
+            for row in cur.fetchall():
+                errors.append({'line': row['line_no'], 'sku': row['sku'], 'error': f'префикс {AUTO_SKU_PREFIX} зарезервирован'})
+
+            # Один statement: обновить существующие sku, вставить новые; при повторе sku в файле побеждает последняя строка
+            cur.execute(f'''
+                WITH src AS (
+                    SELECT DISTINCT ON (sku) * FROM products_import ORDER BY sku, line_no DESC
+                ),
+                upd AS (
+                    UPDATE {schema}.products p SET
+                        name = COALESCE(s.name, p.name),
+                        price = COALESCE(s.price, p.price),
+                        category = COALESCE(s.category, p.category),
+                        image_url = COALESCE(s.image_url, p.image_url),
+                        short_description = COALESCE(s.short_description, p.short_description),
+                        full_description = COALESCE(s.full_description, p.full_description),
+                        features = COALESCE(s.features, p.features),
+                        in_stock = COALESCE(s.in_stock, p.in_stock),
+                        is_new = COALESCE(s.is_new, p.is_new),
+                        discount = COALESCE(s.discount, p.discount),
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM src s
+                    WHERE p.sku = s.sku
+                    RETURNING p.sku
+                ),
+                ins AS (
+                    INSERT INTO {schema}.products
+                        (sku, name, price, category, image_url, short_description, full_description,
+                         features, in_stock, is_new, discount)
+                    SELECT sku, name, price, category, COALESCE(image_url, '/placeholder.svg'),
+                           COALESCE(short_description, ''), COALESCE(full_description, ''),
+                           COALESCE(features, '{{}}'::jsonb), COALESCE(in_stock, true),
+                           COALESCE(is_new, false), COALESCE(discount, 0)
+                    FROM src
+                    WHERE sku NOT IN (SELECT sku FROM upd)
+                    ON CONFLICT (sku) DO NOTHING
+                    RETURNING sku
+                )
+                SELECT (SELECT COUNT(*) FROM ins) AS inserted, (SELECT COUNT(*) FROM upd) AS updated
+            ''')
+            counts = cur.fetchone()
+            inserted, updated = counts['inserted'], counts['updated']
+    conn.commit()
+
+    errors.sort(key=lambda e: e['line'])
+    return {'inserted': inserted, 'updated': updated, 'errors': errors}
+
+
+def export_products(conn, schema: str, fmt: str) -> str:
+    '''Выгрузить каталог серверным курсором, не держа все строки в памяти'''
+    columns = ', '.join(
+        "CASE WHEN has_inline_image THEN NULL ELSE image_url END AS image_url" if c == 'image_url' else c
+        for c in IMPORT_COLUMNS
+    )
+    out = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(IMPORT_COLUMNS)
+
+    with conn.cursor(name='products_export') as cur:
+        cur.itersize = EXPORT_BATCH_SIZE
+        cur.execute(f'SELECT {columns} FROM {schema}.products ORDER BY id')
+        for record in cur:
+            if writer:
+                writer.writerow(
+                    json.dumps(v, ensure_ascii=False) if isinstance(v, dict) else v
+                    for v in record
+                )
+            else:
+                out.write(json.dumps(dict(zip(IMPORT_COLUMNS, record)), ensure_ascii=False, default=str))
+                out.write('\n')
+    conn.rollback()
+    return out.getvalue()
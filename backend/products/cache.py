@@ -0,0 +1,105 @@
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+from psycopg2 import extensions
+
+# Кэш готовых ответов каталога в тёплом инстансе, сбрасывается по NOTIFY products_changed
+CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', '256'))
+CHANNEL = 'products_changed'
+# Как часто инстанс пишет в лог счётчики кэша — так же, как db.py для пула
+STATS_INTERVAL = float(os.environ.get('CATALOG_CACHE_STATS_INTERVAL', '60'))
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_listener = None
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_stats_logged_at = time.monotonic()
+
+
+def cache_key(params: dict) -> str:
+    return '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+
+
+def _connect_listener():
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise Exception('DATABASE_URL not configured')
+    conn = psycopg2.connect(dsn)
+    conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cur:
+        cur.execute(f'LISTEN {CHANNEL}')
+    return conn
+
+
+def invalidate():
+    with _lock:
+        _entries.clear()
+        _stats['invalidations'] += 1
+
+
+def drain():
+    '''Прочитать накопившиеся уведомления; без уведомлений запрос в БД не уходит'''
+    global _listener
+    try:
+        if _listener is None or _listener.closed:
+            # Пока слушателя не было, изменения могли пройти мимо — начинаем с пустого кэша
+            _listener = _connect_listener()
+            invalidate()
+            return
+        if select.select([_listener], [], [], 0)[0]:
+            _listener.poll()
+        if _listener.notifies:
+            _listener.notifies.clear()
+            invalidate()
+    except psycopg2.Error:
+        try:
+            _listener.close()
+        except (psycopg2.Error, AttributeError):
+            pass
+        _listener = None
+        invalidate()
+
+
+def get(key: str):
+    _log_stats()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+        return entry
+
+
+def put(key: str, response: dict):
+    with _lock:
+        _entries[key] = response
+        _entries.move_to_end(key)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def notify_changed(cursor, payload=''):
+    '''Сообщить всем инстансам об изменении каталога (уходит вместе с COMMIT)'''
+    cursor.execute('SELECT pg_notify(%s, %s)', (CHANNEL, str(payload)))
+
+
+def cache_stats() -> dict:
+    '''Счётчики попаданий, промахов и сбросов с момента старта инстанса'''
+    with _lock:
+        return dict(_stats, size=len(_entries), limit=CACHE_SIZE)
+
+
+def _log_stats():
+    '''Одна строка со счётчиками кэша не чаще раза в STATS_INTERVAL секунд'''
+    global _stats_logged_at
+    now = time.monotonic()
+    with _lock:
+        if now - _stats_logged_at < STATS_INTERVAL:
+            return
+        _stats_logged_at = now
+    print(f"catalog cache: {cache_stats()}")
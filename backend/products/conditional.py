@@ -0,0 +1,57 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+
+def get_header(event: dict, name: str):
+    '''Заголовок запроса без учёта регистра'''
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _utc(value):
+    '''Время в UTC; значения без пояса (timestamptz из БД уже с поясом) считаются UTC'''
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def make_validator(params: dict, last_modified, count: int):
+    '''ETag и Last-Modified по max(updated_at) и числу строк выборки'''
+    key = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    stamp = last_modified.isoformat() if last_modified else ''
+    etag = '"' + hashlib.md5(f'{key}|{stamp}|{count}'.encode('utf-8')).hexdigest() + '"'
+    http_date = None
+    if last_modified:
+        http_date = format_datetime(_utc(last_modified).replace(microsecond=0), usegmt=True)
+    return etag, http_date
+
+
+def is_not_modified(event: dict, etag: str, last_modified) -> bool:
+    '''Проверить If-None-Match, а без него — If-Modified-Since'''
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return etag in tags or f'W/{etag}' in tags or '*' in tags
+
+    if_modified_since = get_header(event, 'If-Modified-Since')
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _utc(last_modified).replace(microsecond=0) <= _utc(since)
+    return False
+
+
+def cache_headers(etag: str, http_date) -> dict:
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    if http_date:
+        headers['Last-Modified'] = http_date
+    return headers
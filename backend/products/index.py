@@ -1,12 +1,91 @@
+import base64
 import json
 import os
-import psycopg2
+from datetime import datetime
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from bulk import import_products, export_products
+from search import search_products
+from conditional import make_validator, is_not_modified, cache_headers
+import cache as catalog_cache
+from compression import with_compression
 
+PLACEHOLDER_IMAGE = 'https://placehold.co/400x400/1a1a1a/gray?text=No+Image'
+
+PRODUCT_COLUMNS = (
+    'id', 'sku', 'name', 'price', 'category', 'image_url', 'short_description', 'full_description',
+    'features', 'in_stock', 'is_new', 'discount', 'created_at', 'updated_at'
+)
+
+# Явный список для SELECT/RETURNING: служебные search_vector и has_inline_image клиентам не отдаются
+PRODUCT_SELECT = ', '.join(PRODUCT_COLUMNS)
+
+BULK_CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Колонки, которые можно менять через PATCH
+PATCHABLE_COLUMNS = (
+    'sku', 'name', 'price', 'category', 'image_url', 'short_description', 'full_description',
+    'features', 'in_stock', 'is_new', 'discount'
+)
+
+# Наборы колонок для списка: card — только то, что рисует сетка каталога
+PRODUCT_VIEWS = {
+    'card': ('id', 'name', 'price', 'category', 'image_url', 'short_description', 'in_stock', 'is_new', 'discount', 'created_at'),
+    'full': PRODUCT_COLUMNS,
+}
+
+def build_projection(fields: str):
+    '''Собрать список колонок для SELECT по параметру fields'''
+    if fields in PRODUCT_VIEWS:
+        columns = PRODUCT_VIEWS[fields]
+    else:
+        columns = tuple(f.strip() for f in fields.split(',') if f.strip())
+        unknown = [c for c in columns if c not in PRODUCT_COLUMNS]
+        if unknown or not columns:
+            return None
+    
+    # id и created_at нужны для курсора пагинации
+    columns = tuple(dict.fromkeys(('id', 'created_at') + columns))
+    
+    # base64-изображения заменяются в SQL, чтобы blob не уходил из БД
+    return ', '.join(
+        f"CASE WHEN has_inline_image THEN '{PLACEHOLDER_IMAGE}' ELSE image_url END AS image_url"
+        if c == 'image_url' else c
+        for c in columns
+    )
+
+def build_set_clause(data: dict):
+    '''SET только для переданных колонок'''
+    if not isinstance(data, dict):
+        raise ValueError('Поля для обновления должны быть JSON-объектом')
+    if not data:
+        raise ValueError('Нет полей для обновления')
+    unknown = [k for k in data if k not in PATCHABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    
+    assignments = []
+    values = []
+    for column, value in data.items():
+        assignments.append(f'{column} = %s')
+        values.append(json.dumps(value) if column == 'features' else value)
+    assignments.append('updated_at = CURRENT_TIMESTAMP')
+    return ', '.join(assignments), values
+
+def not_modified_response(headers: dict) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {**headers, 'Access-Control-Allow-Origin': '*'},
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+@with_compression
 def handler(event: dict, context) -> dict:
     '''API для управления товарами магазина'''
     
     method = event.get('httpMethod', 'GET')
+    params = event.get('queryStringParameters') or {}
     
     # CORS
     if method == 'OPTIONS':
@@ -14,29 +93,132 @@ def handler(event: dict, context) -> dict:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    # Тёплый инстанс отдаёт каталог из памяти, пока не пришёл NOTIFY об изменениях
+    cacheable = method == 'GET' and params.get('action') != 'export'
+    if cacheable:
+        catalog_cache.drain()
+        key = catalog_cache.cache_key(params)
+        cached = catalog_cache.get(key)
+        if cached:
+            etag = cached['headers'].get('ETag')
+            if etag and is_not_modified(event, etag, None):
+                return not_modified_response({k: v for k, v in cached['headers'].items() if k in ('ETag', 'Last-Modified', 'Cache-Control')})
+            return cached
+    
+    response = route(event, method, params)
+    
+    if cacheable and response['statusCode'] == 200:
+        catalog_cache.put(key, response)
+    elif method in ('POST', 'PUT', 'PATCH', 'DELETE') and response['statusCode'] < 400:
+        catalog_cache.invalidate()
+    
+    return response
+
+def route(event: dict, method: str, params: dict) -> dict:
+    '''Обработка запроса к БД'''
     # Подключение к БД
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
     
     try:
+        action = params.get('action')
+        
+        if action in ('import', 'export'):
+            fmt = params.get('format', 'ndjson')
+            if fmt not in BULK_CONTENT_TYPES:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Формат должен быть ndjson или csv'}),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'import' and method == 'POST':
+                # Массовая загрузка прайса
+                body = event.get('body') or ''
+                if event.get('isBase64Encoded'):
+                    body = base64.b64decode(body).decode('utf-8')
+                result = import_products(conn, schema, body, fmt)
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'export' and method == 'GET':
+                # Выгрузка каталога
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': f'{BULK_CONTENT_TYPES[fmt]}; charset=utf-8', 'Access-Control-Allow-Origin': '*'},
+                    'body': export_products(conn, schema, fmt),
+                    'isBase64Encoded': False
+                }
+            
+            # Иначе запрос ушёл бы в общие ветки и, например, создал товар из тела прайса
+            return {
+                'statusCode': 405,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Allow': 'POST' if action == 'import' else 'GET'
+                },
+                'body': json.dumps({'error': 'Method not allowed'}),
+                'isBase64Encoded': False
+            }
+        
+        if action == 'search' and method == 'GET':
+            # Поиск с фильтрами и фасетами
+            projection = build_projection(params.get('fields', 'card'))
+            try:
+                if projection is None:
+                    raise ValueError('Некорректный список полей')
+                result = search_products(cursor, schema, params, projection)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result, ensure_ascii=False, default=str),
+                'isBase64Encoded': False
+            }
+        
+        if action == 'categories' and method == 'GET':
+            # Сводка по категориям поддерживается триггерами, каталог не сканируется
+            cursor.execute(f'''
+                SELECT category, product_count, in_stock_count, min_price, new_count
+                FROM {schema}.category_summary
+                ORDER BY category
+            ''')
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'categories': [dict(row) for row in cursor.fetchall()]}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
         if method == 'GET':
-            params = event.get('queryStringParameters') or {}
             product_id = params.get('id')
             
             if product_id:
-                # Получить один товар
-                cursor.execute(f'SELECT * FROM {schema}.products WHERE id = %s', (product_id,))
-                product = cursor.fetchone()
+                # Получить один товар; сначала сверяем валидатор, строку читаем только при изменениях
+                cursor.execute(f'SELECT updated_at::timestamptz AS updated_at FROM {schema}.products WHERE id = %s', (product_id,))
+                stamp = cursor.fetchone()
                 
-                if not product:
+                if not stamp:
                     return {
                         'statusCode': 404,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -44,9 +226,17 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
+                etag, http_date = make_validator(params, stamp['updated_at'], 1)
+                validator_headers = cache_headers(etag, http_date)
+                if is_not_modified(event, etag, stamp['updated_at']):
+                    return not_modified_response(validator_headers)
+                
+                cursor.execute(f'SELECT {PRODUCT_SELECT} FROM {schema}.products WHERE id = %s', (product_id,))
+                product = cursor.fetchone()
+                
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **validator_headers},
                     'body': json.dumps(dict(product), ensure_ascii=False, default=str),
                     'isBase64Encoded': False
                 }
@@ -54,27 +244,80 @@ def handler(event: dict, context) -> dict:
                 # Получить все товары с пагинацией
                 category = params.get('category')
                 limit = int(params.get('limit', '100'))
-                offset = int(params.get('offset', '0'))
+                after = params.get('after')
+                cursor_mode = after is not None or params.get('paginate') == 'cursor'
+                projection = build_projection(params.get('fields', 'card'))
+                
+                if projection is None:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Некорректный список полей'}),
+                        'isBase64Encoded': False
+                    }
                 
+                conditions = []
+                values = []
                 if category:
-                    cursor.execute(f'SELECT * FROM {schema}.products WHERE category = %s ORDER BY created_at DESC LIMIT %s OFFSET %s', (category, limit, offset))
+                    conditions.append('category = %s')
+                    values.append(category)
+                
+                # Валидатор по всей отфильтрованной выборке: max(updated_at) + число строк;
+                # время последнего удаления учитывается, чтобы If-Modified-Since не отдавал 304 после него
+                filter_where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+                cursor.execute(f'''
+                    SELECT GREATEST(
+                               MAX(updated_at)::timestamptz,
+                               (SELECT last_removed_at FROM {schema}.products_catalog_state WHERE id = 1)
+                           ) AS last_modified,
+                           COUNT(*) AS total
+                    FROM {schema}.products {filter_where}
+                ''', values)
+                stamp = cursor.fetchone()
+                etag, http_date = make_validator(params, stamp['last_modified'], stamp['total'])
+                validator_headers = cache_headers(etag, http_date)
+                if is_not_modified(event, etag, stamp['last_modified']):
+                    return not_modified_response(validator_headers)
+                
+                if cursor_mode and after:
+                    # Курсор вида "<created_at>,<id>" — страница по индексу без OFFSET
+                    try:
+                        after_created_at, after_id = after.rsplit(',', 1)
+                        after_created_at = datetime.fromisoformat(after_created_at)
+                        after_id = int(after_id)
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': 'Некорректный курсор'}),
+                            'isBase64Encoded': False
+                        }
+                    conditions.append('(created_at, id) < (%s, %s)')
+                    values.extend([after_created_at, after_id])
+                
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+                
+                if cursor_mode:
+                    cursor.execute(f'SELECT {projection} FROM {schema}.products {where} ORDER BY created_at DESC, id DESC LIMIT %s', (*values, limit))
                 else:
-                    cursor.execute(f'SELECT * FROM {schema}.products ORDER BY created_at DESC LIMIT %s OFFSET %s', (limit, offset))
+                    offset = int(params.get('offset', '0'))
+                    cursor.execute(f'SELECT {projection} FROM {schema}.products {where} ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s', (*values, limit, offset))
                 
-                products = cursor.fetchall()
+                products_list = [dict(p) for p in cursor.fetchall()]
                 
-                # Заменить base64 изображения на placeholder
-                products_list = []
-                for p in products:
-                    product = dict(p)
-                    if product.get('image_url', '').startswith('data:'):
-                        product['image_url'] = 'https://placehold.co/400x400/1a1a1a/gray?text=No+Image'
-                    products_list.append(product)
+                if cursor_mode:
+                    next_cursor = None
+                    if len(products_list) == limit:
+                        last = products_list[-1]
+                        next_cursor = f"{last['created_at'].isoformat()},{last['id']}"
+                    body = {'products': products_list, 'next_cursor': next_cursor}
+                else:
+                    body = products_list
                 
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(products_list, ensure_ascii=False, default=str),
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **validator_headers},
+                    'body': json.dumps(body, ensure_ascii=False, default=str),
                     'isBase64Encoded': False
                 }
         
@@ -84,10 +327,11 @@ def handler(event: dict, context) -> dict:
             
             cursor.execute(f'''
                 INSERT INTO {schema}.products 
-                (name, price, category, image_url, short_description, full_description, features, in_stock, is_new, discount)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
+                (sku, name, price, category, image_url, short_description, full_description, features, in_stock, is_new, discount)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING {PRODUCT_SELECT}
             ''', (
+                data.get('sku') or None,
                 data['name'],
                 data['price'],
                 data['category'],
@@ -101,6 +345,7 @@ def handler(event: dict, context) -> dict:
             ))
             
             product = cursor.fetchone()
+            catalog_cache.notify_changed(cursor, product['id'])
             conn.commit()
             
             return {
@@ -129,7 +374,7 @@ def handler(event: dict, context) -> dict:
                     short_description = %s, full_description = %s, features = %s,
                     in_stock = %s, is_new = %s, discount = %s, updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
-                RETURNING *
+                RETURNING {PRODUCT_SELECT}
             ''', (
                 data['name'],
                 data['price'],
@@ -145,6 +390,7 @@ def handler(event: dict, context) -> dict:
             ))
             
             product = cursor.fetchone()
+            catalog_cache.notify_changed(cursor, product_id)
             conn.commit()
             
             if not product:
@@ -162,6 +408,72 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
+        elif method == 'PATCH':
+            product_id = params.get('id')
+            
+            try:
+                # Некорректный JSON — тоже ValueError и ответ 400
+                data = json.loads(event.get('body') or '{}')
+                if not isinstance(data, dict):
+                    raise ValueError('Тело запроса должно быть JSON-объектом')
+                if product_id:
+                    # Частичное обновление одного товара
+                    set_clause, values = build_set_clause(data)
+                    cursor.execute(
+                        f'UPDATE {schema}.products SET {set_clause} WHERE id = %s RETURNING {PRODUCT_SELECT}',
+                        (*values, product_id)
+                    )
+                    product = cursor.fetchone()
+                    if not product:
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': 'Товар не найден'}),
+                            'isBase64Encoded': False
+                        }
+                    catalog_cache.notify_changed(cursor, product_id)
+                    conn.commit()
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps(dict(product), ensure_ascii=False, default=str),
+                        'isBase64Encoded': False
+                    }
+                
+                # Массовое изменение: {"ids": [...]} или {"category": "..."} и {"set": {...}}
+                set_clause, values = build_set_clause(data.get('set') or {})
+                if data.get('ids'):
+                    if not isinstance(data['ids'], list):
+                        raise ValueError('ids должен быть массивом')
+                    target, target_value = 'id = ANY(%s)', [int(i) for i in data['ids']]
+                elif data.get('category'):
+                    target, target_value = 'category = %s', data['category']
+                else:
+                    raise ValueError('Укажите ids или category')
+            except (ValueError, TypeError) as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            cursor.execute(
+                f'UPDATE {schema}.products SET {set_clause} WHERE {target} RETURNING id',
+                (*values, target_value)
+            )
+            updated_ids = [row['id'] for row in cursor.fetchall()]
+            if updated_ids:
+                catalog_cache.notify_changed(cursor, 'bulk')
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'updated_ids': updated_ids, 'updated_count': len(updated_ids)}),
+                'isBase64Encoded': False
+            }
+        
         elif method == 'DELETE':
             # Удалить товар
             params = event.get('queryStringParameters') or {}
@@ -177,6 +489,7 @@ def handler(event: dict, context) -> dict:
             
             cursor.execute(f'DELETE FROM {schema}.products WHERE id = %s RETURNING id', (product_id,))
             deleted = cursor.fetchone()
+            catalog_cache.notify_changed(cursor, product_id)
             conn.commit()
             
             if not deleted:
@@ -203,4 +516,4 @@ def handler(event: dict, context) -> dict:
     
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
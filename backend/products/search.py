@@ -0,0 +1,123 @@
+import json
+
+FLAG_FILTERS = {
+    'in_stock': 'in_stock',
+    'is_new': 'is_new',
+    'on_sale': 'discount > 0',
+}
+
+
+def _int_param(params: dict, key: str):
+    value = params.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Некорректное значение {key}')
+
+
+def build_filters(params: dict):
+    '''Общие условия поиска; категория и флаги применяются отдельно, чтобы фасет не зависел от своего же фильтра'''
+    conditions = []
+    values = []
+
+    query = (params.get('q') or '').strip()
+    if query:
+        conditions.append("search_vector @@ websearch_to_tsquery('russian', %s)")
+        values.append(query)
+
+    price_min = _int_param(params, 'price_min')
+    if price_min is not None:
+        conditions.append('price >= %s')
+        values.append(price_min)
+
+    price_max = _int_param(params, 'price_max')
+    if price_max is not None:
+        conditions.append('price <= %s')
+        values.append(price_max)
+
+    features = params.get('features')
+    if features:
+        try:
+            features = json.loads(features)
+        except ValueError:
+            features = None
+        if not isinstance(features, dict):
+            raise ValueError('features должен быть JSON-объектом')
+        conditions.append('features @> %s::jsonb')
+        values.append(json.dumps(features, ensure_ascii=False))
+
+    return query, conditions, values
+
+
+def search_products(cursor, schema: str, params: dict, projection: str) -> dict:
+    '''Найти товары и посчитать фасеты одним запросом.
+
+    Каждый фасет считается со всеми фильтрами, кроме своего: выбор категории
+    не обнуляет остальные категории, а включённый флаг — счётчик «без него».
+    '''
+    query, conditions, values = build_filters(params)
+    category = params.get('category')
+    limit = _int_param(params, 'limit') or 24
+    offset = _int_param(params, 'offset') or 0
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    # Отдельные фильтры — колонками base: m_<фильтр> истинна, если строка ему подходит или он не задан
+    selected = {flag: params.get(flag) == 'true' for flag in FLAG_FILTERS}
+    matches = {'category': 'category = %s' if category else 'TRUE'}
+    matches.update((flag, f'({expression})' if selected[flag] else 'TRUE') for flag, expression in FLAG_FILTERS.items())
+    match_columns = ', '.join(f'{condition} AS m_{name}' for name, condition in matches.items())
+    match_values = [category] if category else []
+
+    def all_except(name=None):
+        return ' AND '.join(f'm_{other}' for other in matches if other != name)
+
+    flag_counts = ',\n                '.join(
+        f"'{flag}', COUNT(*) FILTER (WHERE {all_except(flag)} AND {expression})"
+        for flag, expression in FLAG_FILTERS.items()
+    )
+
+    # base несёт только id и колонки фильтров и сортировки: на него ссылаются трижды,
+    # и полные строки (с base64 в image_url) материализовались бы при каждом поиске
+    if query:
+        rank = "ts_rank(search_vector, websearch_to_tsquery('russian', %s))"
+        rank_values = [query]
+        order = 'sort_rank DESC, sort_id DESC'
+    else:
+        rank = '0'
+        rank_values = []
+        order = 'sort_created DESC, sort_id DESC'
+
+    cursor.execute(f'''
+        WITH base AS (
+            SELECT id, category, in_stock, is_new, discount, created_at, {rank} AS rank, {match_columns}
+            FROM {schema}.products {where}
+        ),
+        page_ids AS (
+            SELECT id AS sort_id, created_at AS sort_created, rank AS sort_rank
+            FROM base WHERE {all_except()}
+            ORDER BY {order} LIMIT %s OFFSET %s
+        )
+        SELECT
+            (SELECT COALESCE(json_agg(page), '[]'::json) FROM (
+                SELECT {projection} FROM {schema}.products p
+                JOIN page_ids ON page_ids.sort_id = p.id
+                ORDER BY {order}
+            ) page) AS products,
+            (SELECT COALESCE(json_object_agg(category, cnt), '{{}}'::json) FROM (
+                SELECT category, COUNT(*) AS cnt FROM base WHERE {all_except('category')} GROUP BY category
+            ) c) AS categories,
+            (SELECT json_build_object(
+                'total', COUNT(*) FILTER (WHERE {all_except()}),
+                {flag_counts}
+            ) FROM base) AS flags
+    ''', (*rank_values, *match_values, *values, limit, offset))
+
+    row = cursor.fetchone()
+    return {
+        'products': row['products'],
+        'total': row['flags']['total'],
+        'facets': {'categories': row['categories'], 'flags': row['flags']},
+    }
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions
+
+# Пул живёт на уровне модуля и переживает тёплые вызовы функции.
+# Файл одинаков во всех backend/*/db.py — правка вносится во все копии сразу
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+# Как часто инстанс пишет в лог счётчики пула
+POOL_STATS_INTERVAL = float(os.environ.get('DB_POOL_STATS_INTERVAL', '60'))
+
+_idle = []
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'discarded': 0}
+_stats_logged_at = time.monotonic()
+
+
+def _is_healthy(conn, idle_for: float) -> bool:
+    '''Проверить, что соединение можно переиспользовать'''
+    if conn.closed:
+        return False
+    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        return False
+    if idle_for < POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _count(key: str):
+    with _lock:
+        _stats[key] += 1
+
+
+def _discard(conn):
+    _count('discarded')
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+
+def get_connection():
+    '''Взять соединение из пула или открыть новое'''
+    now = time.monotonic()
+    while True:
+        with _lock:
+            if not _idle:
+                break
+            conn, released_at = _idle.pop()
+        idle_for = now - released_at
+        if idle_for > POOL_IDLE_TIMEOUT or not _is_healthy(conn, idle_for):
+            _discard(conn)
+            continue
+        _count('hits')
+        return conn
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        raise Exception('DATABASE_URL not configured')
+    conn = psycopg2.connect(dsn)
+    _count('misses')
+    return conn
+
+
+def release_connection(conn):
+    '''Вернуть соединение в пул; сломанные и лишние закрываются'''
+    if conn is None:
+        return
+    if conn.closed:
+        _count('discarded')
+        return
+    try:
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _discard(conn)
+        return
+    _log_stats()
+    with _lock:
+        if len(_idle) < POOL_SIZE:
+            _idle.append((conn, time.monotonic()))
+            return
+    _discard(conn)
+
+
+def pool_stats() -> dict:
+    '''Счётчики попаданий и промахов пула с момента старта инстанса'''
+    with _lock:
+        return dict(_stats, idle=len(_idle), size=POOL_SIZE)
+
+
+def _log_stats():
+    '''Одна строка со счётчиками пула не чаще раза в POOL_STATS_INTERVAL секунд'''
+    global _stats_logged_at
+    now = time.monotonic()
+    with _lock:
+        if now - _stats_logged_at < POOL_STATS_INTERVAL:
+            return
+        _stats_logged_at = now
+    print(f"db pool: {pool_stats()}")
+
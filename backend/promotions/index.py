@@ -1,8 +1,15 @@
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from compression import with_compression
 
+def parse_percent(body: dict):
+    '''Процент скидки для расчёта корзин — только явный percent_off, текст discount не разбирается'''
+    if body.get('percent_off') in (None, ''):
+        return None
+    return int(body['percent_off'])
+
+@with_compression
 def handler(event: dict, context) -> dict:
     '''API для управления акциями и email-рассылкой.'''
     
@@ -24,7 +31,7 @@ def handler(event: dict, context) -> dict:
         }
     
     # Подключение к БД
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -87,8 +94,8 @@ def handler(event: dict, context) -> dict:
             body = json.loads(event.get('body', '{}'))
             cursor.execute('''
                 INSERT INTO promotions 
-                (title, description, discount, image_url, valid_until, is_active)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                (title, description, discount, image_url, valid_until, is_active, percent_off, category, ends_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING *
             ''', (
                 body['title'],
@@ -96,7 +103,10 @@ def handler(event: dict, context) -> dict:
                 body.get('discount', ''),
                 body.get('image_url', '/placeholder.svg'),
                 body.get('valid_until', ''),
-                body.get('is_active', True)
+                body.get('is_active', True),
+                parse_percent(body),
+                body.get('category') or None,
+                body.get('ends_at') or None
             ))
             promo = cursor.fetchone()
             conn.commit()
@@ -120,7 +130,11 @@ def handler(event: dict, context) -> dict:
             cursor.execute('''
                 UPDATE promotions 
                 SET title = %s, description = %s, discount = %s, image_url = %s, 
-                    valid_until = %s, is_active = %s, updated_at = CURRENT_TIMESTAMP
+                    valid_until = %s, is_active = %s,
+                    percent_off = CASE WHEN %s THEN %s ELSE percent_off END,
+                    category = CASE WHEN %s THEN %s ELSE category END,
+                    ends_at = CASE WHEN %s THEN %s ELSE ends_at END,
+                    updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
                 RETURNING *
             ''', (
@@ -130,6 +144,9 @@ def handler(event: dict, context) -> dict:
                 body.get('image_url', '/placeholder.svg'),
                 body.get('valid_until', ''),
                 body.get('is_active', True),
+                'percent_off' in body, parse_percent(body),
+                'category' in body, body.get('category') or None,
+                'ends_at' in body, body.get('ends_at') or None,
                 promo_id
             ))
             promo = cursor.fetchone()
@@ -183,4 +200,4 @@ def handler(event: dict, context) -> dict:
     
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
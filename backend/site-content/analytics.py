@@ -0,0 +1,162 @@
+import os
+
+REFRESH_BATCH = int(os.environ.get('ANALYTICS_REFRESH_BATCH', '50000'))
+REFRESH_INTERVAL = int(os.environ.get('ANALYTICS_REFRESH_INTERVAL', '60'))
+DAILY_IPS_RETENTION_DAYS = int(os.environ.get('ANALYTICS_DAILY_IPS_RETENTION_DAYS', '60'))
+
+# Один проход по новым строкам page_views раскладывает их во все агрегаты сразу
+ROLLUP_SQL = '''
+    WITH src AS (
+        SELECT page_url, user_ip, referrer, created_at
+        FROM page_views
+        WHERE id > %(from_id)s AND id <= %(to_id)s
+    ),
+    hourly AS (
+        INSERT INTO page_views_hourly (hour, page_url, views)
+        SELECT date_trunc('hour', created_at), page_url, COUNT(*)
+        FROM src GROUP BY 1, 2
+        ON CONFLICT (hour, page_url) DO UPDATE SET views = page_views_hourly.views + EXCLUDED.views
+    ),
+    by_url AS (
+        INSERT INTO page_views_by_url (page_url, views)
+        SELECT page_url, COUNT(*) FROM src GROUP BY 1
+        ON CONFLICT (page_url) DO UPDATE SET views = page_views_by_url.views + EXCLUDED.views
+    ),
+    referrers AS (
+        INSERT INTO referrers_daily (day, referrer, views)
+        SELECT created_at::DATE, referrer, COUNT(*)
+        FROM src WHERE referrer IS NOT NULL GROUP BY 1, 2
+        ON CONFLICT (day, referrer) DO UPDATE SET views = referrers_daily.views + EXCLUDED.views
+    ),
+    new_daily_ips AS (
+        INSERT INTO page_view_daily_ips (day, user_ip)
+        SELECT DISTINCT created_at::DATE, user_ip FROM src WHERE user_ip IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING day
+    ),
+    new_visitors AS (
+        INSERT INTO page_view_visitors (user_ip, first_seen)
+        SELECT user_ip, MIN(created_at) FROM src WHERE user_ip IS NOT NULL GROUP BY 1
+        ON CONFLICT DO NOTHING
+        RETURNING user_ip
+    ),
+    daily AS (
+        INSERT INTO page_views_daily (day, views, unique_ips)
+        SELECT v.day, v.views, COALESCE(u.unique_ips, 0)
+        FROM (SELECT created_at::DATE AS day, COUNT(*) AS views FROM src GROUP BY 1) v
+        LEFT JOIN (SELECT day, COUNT(*) AS unique_ips FROM new_daily_ips GROUP BY 1) u ON u.day = v.day
+        ON CONFLICT (day) DO UPDATE
+        SET views = page_views_daily.views + EXCLUDED.views,
+            unique_ips = page_views_daily.unique_ips + EXCLUDED.unique_ips
+    )
+    UPDATE analytics_state
+    SET last_page_view_id = %(to_id)s,
+        total_views = total_views + (SELECT COUNT(*) FROM src),
+        unique_ips = unique_ips + (SELECT COUNT(*) FROM new_visitors),
+        refreshed_at = CURRENT_TIMESTAMP
+    WHERE id = 1
+'''
+
+
+def committed_upper_bound(conn, cur) -> int:
+    '''Наибольший id, ниже которого все вставки уже закоммичены.
+
+    SHARE-блокировка дожидается завершения идущих INSERT и на миг задерживает новые,
+    поэтому строка с меньшим id не может появиться после того, как отметка её пропустила.
+    '''
+    cur.execute('LOCK TABLE page_views IN SHARE MODE')
+    cur.execute('SELECT COALESCE(MAX(id), 0) AS max_id FROM page_views')
+    upper = cur.fetchone()['max_id']
+    conn.commit()
+    return upper
+
+
+def refresh_rollups(conn, cur, force: bool = False) -> dict:
+    '''Дообработать просмотры после отметки; параллельный вызов просто пропускается'''
+    cur.execute('''
+        SELECT last_page_view_id, refreshed_at,
+               refreshed_at IS NULL OR refreshed_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second' AS due
+        FROM analytics_state WHERE id = 1
+    ''', (REFRESH_INTERVAL,))
+    state = cur.fetchone()
+    conn.commit()
+    if not state or not (force or state['due']):
+        return {'processed_to': state['last_page_view_id'] if state else 0, 'skipped': True}
+
+    upper = committed_upper_bound(conn, cur)
+
+    cur.execute('SELECT last_page_view_id FROM analytics_state WHERE id = 1 FOR UPDATE SKIP LOCKED')
+    row = cur.fetchone()
+    if not row:
+        conn.rollback()
+        return {'processed_to': state['last_page_view_id'], 'skipped': True}
+
+    from_id = row['last_page_view_id']
+    while from_id < upper:
+        to_id = min(upper, from_id + REFRESH_BATCH)
+        cur.execute(ROLLUP_SQL, {'from_id': from_id, 'to_id': to_id})
+        from_id = to_id
+
+    cur.execute(
+        'UPDATE analytics_state SET refreshed_at = CURRENT_TIMESTAMP WHERE id = 1'
+    )
+    cur.execute(
+        "DELETE FROM page_view_daily_ips WHERE day < CURRENT_DATE - %s",
+        (DAILY_IPS_RETENTION_DAYS,)
+    )
+    conn.commit()
+    return {'processed_to': from_id, 'skipped': False}
+
+
+def dashboard_stats(cur) -> dict:
+    '''Данные для AdminAnalytics.tsx только из агрегатов'''
+    cur.execute('''
+        SELECT s.total_views, s.unique_ips, s.refreshed_at,
+               COALESCE((SELECT views FROM page_views_daily WHERE day = CURRENT_DATE), 0) AS today,
+               COALESCE((SELECT SUM(views) FROM page_views_daily WHERE day > CURRENT_DATE - 7), 0) AS week
+        FROM analytics_state s WHERE s.id = 1
+    ''')
+    views = cur.fetchone()
+
+    cur.execute('SELECT page_url AS page, views FROM page_views_by_url ORDER BY views DESC LIMIT 10')
+    top_pages = [dict(row) for row in cur.fetchall()]
+
+    cur.execute('''
+        SELECT referrer, SUM(views) AS views
+        FROM referrers_daily
+        WHERE day > CURRENT_DATE - 30
+        GROUP BY referrer
+        ORDER BY views DESC
+        LIMIT 10
+    ''')
+    referrers = [dict(row) for row in cur.fetchall()]
+
+    cur.execute('''
+        SELECT status, SUM(orders) AS orders, SUM(revenue) AS revenue
+        FROM orders_daily
+        GROUP BY status
+    ''')
+    by_status = {row['status']: row for row in cur.fetchall()}
+
+    return {
+        'views': {
+            'total': int(views['total_views']),
+            'unique': int(views['unique_ips']),
+            'today': int(views['today']),
+            'week': int(views['week'])
+        },
+        'top_pages': [{'page': row['page'], 'views': int(row['views'])} for row in top_pages],
+        'referrers': [{'referrer': row['referrer'], 'views': int(row['views'])} for row in referrers],
+        'orders': {
+            'total': int(sum(row['orders'] for row in by_status.values())),
+            'new': int(by_status.get('new', {}).get('orders', 0)),
+            'completed': int(by_status.get('completed', {}).get('orders', 0)),
+            # Выручка без отменённых заказов
+            'revenue': float(sum(row['revenue'] for status, row in by_status.items() if status != 'cancelled')),
+            'by_status': {
+                status: {'orders': int(row['orders']), 'revenue': float(row['revenue'])}
+                for status, row in by_status.items()
+            }
+        },
+        'refreshed_at': views['refreshed_at'].isoformat() if views['refreshed_at'] else None
+    }
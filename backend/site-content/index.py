@@ -2,7 +2,22 @@ import json
 import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from compression import with_compression
+from ingest import parse_events, build_rows, insert_page_views, remember_partitions, apply_retention
+from analytics import refresh_rollups, dashboard_stats
+from orders import list_orders, change_status
+from notifications import fetch_feed, wait_for_feed
 
+def client_info(event: dict):
+    '''IP и User-Agent посетителя из запроса'''
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    forwarded = headers.get('x-forwarded-for', '')
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    user_ip = forwarded.split(',')[0].strip() or identity.get('sourceIp')
+    return (user_ip or None), headers.get('user-agent')
+
+@with_compression
 def handler(event: dict, context) -> dict:
     """API для управления уведомлениями, аналитикой и заказами"""
     
@@ -22,6 +37,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
+    conn = None
     try:
         dsn = os.environ.get('DATABASE_URL')
         if not dsn:
@@ -32,40 +48,165 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(dsn)
+        conn = get_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         if action == 'notifications' and method == 'GET':
+            # since_id — только новые; wait — long-poll до появления новых
+            try:
+                since_id = int(query_params['since_id']) if query_params.get('since_id') else None
+                wait = float(query_params.get('wait') or 0)
+            except ValueError:
+                since_id, wait = None, 0
+            
             try:
-                cursor.execute("""
-                    SELECT id, title, message, type, is_read, link, created_at
-                    FROM admin_notifications
-                    ORDER BY created_at DESC
-                    LIMIT 50
-                """)
-                notifications = cursor.fetchall()
-            except psycopg2.Error:
-                notifications = []
+                if since_id is not None and wait > 0:
+                    feed = wait_for_feed(conn, cursor, since_id, wait)
+                else:
+                    feed = fetch_feed(cursor, since_id)
+                    conn.commit()
+            except psycopg2.Error as e:
+                # Ошибку не маскируем пустым ответом: клиент должен сделать паузу, а не опрашивать снова
+                if not conn.closed:
+                    conn.rollback()
+                cursor.close()
+                return {
+                    'statusCode': 503,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '30'},
+                    'body': json.dumps({'error': str(e), 'notifications': []}),
+                    'isBase64Encoded': False
+                }
+            
+            cursor.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(feed),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'analytics-stats' and method == 'GET':
+            # Агрегаты дообновляются не чаще ANALYTICS_REFRESH_INTERVAL, чтение — только из них
+            refresh_rollups(conn, cursor)
+            stats = dashboard_stats(cursor)
+            conn.commit()
+            cursor.close()
             
-            notif_list = []
-            for notif in notifications:
-                notif_list.append({
-                    'id': notif['id'],
-                    'title': notif['title'],
-                    'message': notif['message'],
-                    'type': notif['type'],
-                    'is_read': notif['is_read'],
-                    'link': notif['link'],
-                    'created_at': notif['created_at'].isoformat() if notif.get('created_at') else None
-                })
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(stats, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'analytics-refresh' and method == 'POST':
+            result = refresh_rollups(conn, cursor, force=True)
+            cursor.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'orders' and method == 'GET':
+            try:
+                result = list_orders(cursor, query_params)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e), 'orders': []}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            conn.commit()
+            cursor.close()
             
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'order-status' and method == 'PUT':
+            # Один заказ ({id, status}) или много ({ids, status, from_status?})
+            body = json.loads(event.get('body', '{}'))
+            ids = body.get('ids') or ([body['id']] if body.get('id') is not None else [])
+            from_status = body.get('from_status')
+            try:
+                updated_ids = change_status(
+                    cursor,
+                    ids,
+                    body.get('status'),
+                    [from_status] if isinstance(from_status, str) else from_status,
+                    body.get('admin_user')
+                )
+            except ValueError as e:
+                conn.rollback()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            conn.commit()
+            cursor.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'updated_ids': updated_ids, 'updated_count': len(updated_ids)}),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'page-views' and method == 'POST':
+            # Пачка просмотров из клиентского буфера — одна транзакция на пачку
+            try:
+                events = parse_events(event)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            user_ip, user_agent = client_info(event)
+            rows = build_rows(events, user_ip, user_agent)
+            inserted = insert_page_views(cursor, rows)
+            conn.commit()
+            remember_partitions(rows)
+            cursor.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'inserted': inserted}),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'page-views-retention' and method == 'POST':
+            try:
+                months = query_params.get('months')
+                result = apply_retention(cursor, int(months)) if months else apply_retention(cursor)
+            except ValueError as e:
+                conn.rollback()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            conn.commit()
             cursor.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'notifications': notif_list}),
+                'body': json.dumps(result),
                 'isBase64Encoded': False
             }
         
@@ -79,7 +220,6 @@ def handler(event: dict, context) -> dict:
             )
             conn.commit()
             cursor.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -89,7 +229,6 @@ def handler(event: dict, context) -> dict:
             }
         
         cursor.close()
-        conn.close()
         
         return {
             'statusCode': 400,
@@ -105,3 +244,5 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': str(e), 'notifications': []}),
             'isBase64Encoded': False
         }
+    finally:
+        release_connection(conn)
@@ -0,0 +1,113 @@
+import base64
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import execute_values
+
+MAX_EVENTS = int(os.environ.get('PAGE_VIEWS_MAX_EVENTS', '200'))
+RETENTION_MONTHS = int(os.environ.get('PAGE_VIEWS_RETENTION_MONTHS', '13'))
+# Буфер на клиенте может отправить события с задержкой, но не старше суток
+MAX_EVENT_AGE = timedelta(days=1)
+# Наибольшее смещение часового пояса: месяц в поясе БД отличается от месяца в UTC не дальше этого
+MAX_TZ_OFFSET = timedelta(hours=14)
+
+# Месяцы, для которых секция уже точно есть, — в тёплом инстансе проверка не повторяется
+_known_partitions = set()
+
+
+def parse_events(event: dict) -> list:
+    '''Тело запроса: массив событий или {"events": [...]}; sendBeacon шлёт его как text/plain'''
+    body = event.get('body') or '[]'
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    payload = json.loads(body)
+    events = payload.get('events', []) if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        raise ValueError('Ожидается массив событий')
+    if len(events) > MAX_EVENTS:
+        raise ValueError(f'Не больше {MAX_EVENTS} событий за запрос')
+    return events
+
+
+def _timestamp(value, now: datetime) -> datetime:
+    '''Время события из ts (мс с эпохи); неправдоподобное заменяется временем приёма.
+
+    Время остаётся с поясом UTC: при записи в TIMESTAMP PostgreSQL переводит его
+    в пояс сессии, как и CURRENT_TIMESTAMP по умолчанию.
+    '''
+    try:
+        ts = datetime.fromtimestamp(float(value) / 1000, timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return now
+    return ts if now - MAX_EVENT_AGE <= ts <= now else now
+
+
+def build_rows(events: list, user_ip: str, user_agent: str) -> list:
+    now = datetime.now(timezone.utc)
+    # user_ip — VARCHAR(45): длинное значение из заголовка не должно ронять всю пачку
+    user_ip = user_ip[:45] if user_ip else None
+    rows = []
+    for item in events:
+        if not isinstance(item, dict):
+            continue
+        page_url = item.get('page_url') or item.get('url')
+        if not isinstance(page_url, str) or not page_url:
+            continue
+        referrer = item.get('referrer')
+        rows.append((
+            page_url[:500],
+            user_ip,
+            user_agent,
+            referrer[:500] if isinstance(referrer, str) and referrer else None,
+            _timestamp(item.get('ts'), now)
+        ))
+    return rows
+
+
+def _months(timestamps) -> set:
+    # Месяц строки определяется в поясе БД, поэтому у границы месяца создаются обе соседние секции
+    return {
+        (ts + shift).date().replace(day=1)
+        for ts in timestamps
+        for shift in (-MAX_TZ_OFFSET, MAX_TZ_OFFSET)
+    }
+
+
+def ensure_partitions(cur, timestamps):
+    months = sorted(_months(timestamps) - _known_partitions)
+    if months:
+        cur.execute('SELECT ensure_page_views_partition(month) FROM unnest(%s::date[]) AS month', (months,))
+
+
+def remember_partitions(rows: list):
+    '''Вызывается после commit: откат вставки откатывает и создание секции'''
+    _known_partitions.update(_months(row[4] for row in rows))
+
+
+def insert_page_views(cur, rows: list) -> int:
+    '''Записать всю пачку одним многострочным INSERT'''
+    if not rows:
+        return 0
+    ensure_partitions(cur, [row[4] for row in rows])
+    execute_values(
+        cur,
+        'INSERT INTO page_views (page_url, user_ip, user_agent, referrer, created_at) VALUES %s',
+        rows,
+        page_size=len(rows)
+    )
+    return len(rows)
+
+
+def apply_retention(cur, months: int = RETENTION_MONTHS) -> dict:
+    '''Заранее создать секцию следующего месяца и удалить секции старше срока хранения'''
+    if months < 1:
+        raise ValueError('Срок хранения — не меньше одного месяца')
+    cur.execute("SELECT date_trunc('month', LOCALTIMESTAMP)::date AS month")
+    today = cur.fetchone()['month']
+    next_month = (today + timedelta(days=32)).replace(day=1)
+    cur.execute('SELECT ensure_page_views_partition(%s)', (next_month,))
+
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    cutoff = today.replace(year=year, month=month + 1)
+    cur.execute('SELECT drop_page_views_partitions_before(%s) AS dropped', (cutoff,))
+    return {'dropped': cur.fetchone()['dropped'], 'cutoff': cutoff.isoformat()}
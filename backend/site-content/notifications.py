@@ -0,0 +1,87 @@
+import os
+import select
+import time
+import psycopg2
+
+PAGE_SIZE = 50
+MAX_WAIT = int(os.environ.get('NOTIFICATIONS_MAX_WAIT', '25'))
+CHANNEL = 'admin_notifications'
+
+
+def _serialize(notif: dict) -> dict:
+    return {
+        'id': notif['id'],
+        'title': notif['title'],
+        'message': notif['message'],
+        'type': notif['type'],
+        'is_read': notif['is_read'],
+        'link': notif['link'],
+        'created_at': notif['created_at'].isoformat() if notif.get('created_at') else None
+    }
+
+
+def fetch_feed(cur, since_id: int = None) -> dict:
+    '''Полный список или только уведомления новее since_id, плюс счётчик непрочитанных.
+
+    Новые отдаются по возрастанию id порциями по PAGE_SIZE, а last_id — наибольший
+    из реально отданных: остаток клиент заберёт следующим запросом.
+    '''
+    if since_id is None:
+        cur.execute('''
+            SELECT id, title, message, type, is_read, link, created_at
+            FROM admin_notifications
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        ''', (PAGE_SIZE,))
+    else:
+        cur.execute('''
+            SELECT id, title, message, type, is_read, link, created_at
+            FROM admin_notifications
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        ''', (since_id, PAGE_SIZE))
+    notifications = [_serialize(row) for row in cur.fetchall()]
+
+    cur.execute('SELECT unread FROM admin_notification_counters WHERE id = 1')
+    counters = cur.fetchone() or {'unread': 0}
+    return {
+        'notifications': notifications,
+        'unread_count': counters['unread'],
+        'last_id': max((notif['id'] for notif in notifications), default=since_id or 0)
+    }
+
+
+def wait_for_feed(conn, cur, since_id: int, wait: float) -> dict:
+    '''Long-poll: вернуть новые уведомления сразу или дождаться NOTIFY не дольше wait секунд'''
+    wait = min(max(wait, 0), MAX_WAIT)
+    # LISTEN до первой выборки: уведомление между проверкой и ожиданием не потеряется
+    cur.execute(f'LISTEN {CHANNEL}')
+    conn.commit()
+    try:
+        feed = fetch_feed(cur, since_id)
+        conn.commit()
+        deadline = time.monotonic() + wait
+        while not feed['notifications']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if select.select([conn], [], [], remaining) == ([], [], []):
+                break
+            conn.poll()
+            if conn.notifies:
+                conn.notifies.clear()
+                feed = fetch_feed(cur, since_id)
+                conn.commit()
+        return feed
+    finally:
+        # Соединение вернётся в пул — подписка не должна пережить запрос. После ошибки
+        # транзакция прервана: сначала откат, а если и UNLISTEN не прошёл, соединение
+        # закрывается, и пул его отбросит
+        try:
+            conn.rollback()
+            cur.execute(f'UNLISTEN {CHANNEL}')
+            conn.commit()
+        except psycopg2.Error:
+            conn.close()
+        conn.notifies.clear()
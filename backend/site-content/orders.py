@@ -0,0 +1,122 @@
+import os
+from datetime import date
+
+ORDER_STATUSES = ('new', 'processing', 'completed', 'cancelled')
+DEFAULT_LIMIT = 50
+MAX_LIMIT = int(os.environ.get('ORDERS_MAX_LIMIT', '200'))
+MAX_BULK = int(os.environ.get('ORDERS_MAX_BULK', '1000'))
+
+ORDER_COLUMNS = '''id, user_name, user_phone, user_email, product_name, product_price,
+    quantity, total_price, status, notes, created_at, updated_at'''
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _serialize(order: dict) -> dict:
+    order = dict(order)
+    for key in ('product_price', 'total_price'):
+        if order.get(key) is not None:
+            order[key] = float(order[key])
+    for key in ('created_at', 'updated_at'):
+        if order.get(key) is not None:
+            order[key] = order[key].isoformat()
+    return order
+
+
+def list_orders(cur, params: dict) -> dict:
+    '''Страница заказов по keyset-курсору "<created_at>,<id>" с фильтрами'''
+    conditions = []
+    values = []
+
+    statuses = [s for s in (params.get('status') or '').split(',') if s]
+    if statuses:
+        if any(s not in ORDER_STATUSES for s in statuses):
+            raise ValueError('Некорректный статус')
+        if len(statuses) == 1:
+            conditions.append('status = %s')
+            values.append(statuses[0])
+        else:
+            conditions.append('status = ANY(%s)')
+            values.append(statuses)
+
+    try:
+        if params.get('date_from'):
+            conditions.append('created_at >= %s')
+            values.append(date.fromisoformat(params['date_from']))
+        if params.get('date_to'):
+            # Дата включительно
+            conditions.append("created_at < %s::date + 1")
+            values.append(date.fromisoformat(params['date_to']))
+    except ValueError:
+        raise ValueError('Дата должна быть в формате ГГГГ-ММ-ДД')
+
+    if params.get('phone'):
+        conditions.append("user_phone LIKE %s ESCAPE '\\'")
+        values.append(_escape_like(params['phone']) + '%')
+    if params.get('email'):
+        conditions.append("lower(user_email) LIKE %s ESCAPE '\\'")
+        values.append(_escape_like(params['email'].lower()) + '%')
+
+    after = params.get('after')
+    if after:
+        try:
+            after_created_at, after_id = after.rsplit(',', 1)
+            after_id = int(after_id)
+        except ValueError:
+            raise ValueError('Некорректный курсор')
+        conditions.append('(created_at, id) < (%s, %s)')
+        values.extend([after_created_at, after_id])
+
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise ValueError('Некорректный limit')
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cur.execute(
+        f'SELECT {ORDER_COLUMNS} FROM orders {where} ORDER BY created_at DESC, id DESC LIMIT %s',
+        (*values, limit)
+    )
+    orders = cur.fetchall()
+
+    next_cursor = None
+    if len(orders) == limit:
+        last = orders[-1]
+        next_cursor = f"{last['created_at'].isoformat()},{last['id']}"
+    return {'orders': [_serialize(order) for order in orders], 'next_cursor': next_cursor}
+
+
+def change_status(cur, ids: list, status: str, from_statuses=None, admin_user: str = None) -> list:
+    '''Перевести заказы в статус одним запросом и записать это в журнал действий'''
+    if status not in ORDER_STATUSES:
+        raise ValueError('Некорректный статус')
+    if from_statuses and any(s not in ORDER_STATUSES for s in from_statuses):
+        raise ValueError('Некорректный исходный статус')
+    ids = sorted({int(order_id) for order_id in ids})
+    if not ids:
+        raise ValueError('Не указаны заказы')
+    if len(ids) > MAX_BULK:
+        raise ValueError(f'Не больше {MAX_BULK} заказов за раз')
+
+    cur.execute('''
+        WITH changed AS (
+            UPDATE orders
+            SET status = %(status)s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ANY(%(ids)s)
+              AND status IS DISTINCT FROM %(status)s
+              AND (%(from)s::varchar[] IS NULL OR status = ANY(%(from)s::varchar[]))
+            RETURNING id
+        ),
+        logged AS (
+            INSERT INTO admin_activity_log (action, description, admin_user)
+            SELECT 'order-status',
+                   'Статус "' || %(status)s || '" для заказов: ' || string_agg(id::text, ', ' ORDER BY id),
+                   %(admin)s
+            FROM changed
+            HAVING COUNT(*) > 0
+        )
+        SELECT COALESCE(array_agg(id ORDER BY id), '{}') AS ids FROM changed
+    ''', {'status': status, 'ids': ids, 'from': list(from_statuses) if from_statuses else None, 'admin': admin_user})
+    return cur.fetchone()['ids']
@@ -1,8 +1,11 @@
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from compression import with_compression
 
+NEW_TEXT_SECTION = 'custom'
+
+@with_compression
 def handler(event: dict, context) -> dict:
     """API для управления всеми текстами сайта"""
     
@@ -20,12 +23,9 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
+    conn = None
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        if not dsn:
-            raise Exception('DATABASE_URL not configured')
-        
-        conn = psycopg2.connect(dsn)
+        conn = get_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
@@ -50,7 +50,6 @@ def handler(event: dict, context) -> dict:
                 }
             
             cursor.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -65,17 +64,35 @@ def handler(event: dict, context) -> dict:
         elif method == 'PUT':
             body = json.loads(event.get('body', '{}'))
             
-            updated_count = 0
+            # Значение — строка или {value, section, description} для нового ключа
+            keys, values, sections, descriptions = [], [], [], []
             for text_key, text_value in body.items():
-                cursor.execute(
-                    'UPDATE site_texts SET text_value = %s, updated_at = CURRENT_TIMESTAMP WHERE text_key = %s',
-                    (text_value, text_key)
-                )
-                updated_count += cursor.rowcount
+                entry = text_value if isinstance(text_value, dict) else {'value': text_value}
+                if not isinstance(entry.get('value'), str):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Invalid value for {text_key}'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                keys.append(text_key)
+                values.append(entry['value'])
+                sections.append(entry.get('section') or NEW_TEXT_SECTION)
+                descriptions.append(entry.get('description'))
+            
+            # Весь редактор сохраняется одним запросом; section и description существующих ключей не меняются
+            cursor.execute('''
+                INSERT INTO site_texts (text_key, text_value, section, description)
+                SELECT * FROM UNNEST(%s::varchar[], %s::text[], %s::varchar[], %s::text[])
+                ON CONFLICT (text_key) DO UPDATE
+                SET text_value = EXCLUDED.text_value, updated_at = CURRENT_TIMESTAMP
+                WHERE site_texts.text_value IS DISTINCT FROM EXCLUDED.text_value
+                RETURNING text_key, (xmax = 0) AS inserted
+            ''', (keys, values, sections, descriptions))
+            changed = cursor.fetchall()
             
             conn.commit()
             cursor.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -83,7 +100,13 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'success': True, 'message': 'Texts updated', 'updated_count': updated_count}),
+                'body': json.dumps({
+                    'success': True,
+                    'message': 'Texts updated',
+                    'updated_count': len(changed),
+                    'updated': [row['text_key'] for row in changed if not row['inserted']],
+                    'created': [row['text_key'] for row in changed if row['inserted']]
+                }, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
@@ -105,3 +128,5 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
+    finally:
+        release_connection(conn)
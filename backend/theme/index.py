@@ -1,8 +1,60 @@
 import json
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from compression import with_compression
 
+# Сколько браузер может помнить, какая версия актуальна
+STYLESHEET_POINTER_MAX_AGE = 300
+
+def stylesheet_url(stylesheet_hash: str) -> str:
+    return f'?format=css&v={stylesheet_hash}'
+
+def stylesheet_response(cursor, requested_hash: str = None) -> dict:
+    '''CSS темы: без v — короткий редирект на актуальную версию, с v — неизменяемый ответ'''
+    if not requested_hash:
+        cursor.execute('SELECT hash FROM site_theme_current WHERE id = 1')
+        current = cursor.fetchone()
+        if not current:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Stylesheet not published'}),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 302,
+            'headers': {
+                'Location': stylesheet_url(current['hash']),
+                'Cache-Control': f'public, max-age={STYLESHEET_POINTER_MAX_AGE}',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    cursor.execute('SELECT css FROM site_theme_stylesheets WHERE hash = %s', (requested_hash,))
+    stylesheet = cursor.fetchone()
+    if not stylesheet:
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Stylesheet not found'}),
+            'isBase64Encoded': False
+        }
+    # Содержимое по хэшу никогда не меняется
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'text/css; charset=utf-8',
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'ETag': f'"{requested_hash}"',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': stylesheet['css'],
+        'isBase64Encoded': False
+    }
+
+@with_compression
 def handler(event: dict, context) -> dict:
     """API для управления цветовой схемой сайта"""
     
@@ -19,15 +71,17 @@ def handler(event: dict, context) -> dict:
             'body': '',
             'isBase64Encoded': False
         }
-    
+
+    conn = None
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        if not dsn:
-            raise Exception('DATABASE_URL not configured')
-        
-        conn = psycopg2.connect(dsn)
+        conn = get_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
+        params = event.get('queryStringParameters') or {}
+        
+        if method == 'GET' and params.get('format') == 'css':
+            return stylesheet_response(cursor, params.get('v'))
+        
         if method == 'GET':
             cursor.execute('SELECT * FROM site_theme ORDER BY theme_key')
             results = cursor.fetchall()
@@ -35,7 +89,6 @@ def handler(event: dict, context) -> dict:
             theme_data = {row['theme_key']: row['color_value'] for row in results}
             
             cursor.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -50,15 +103,31 @@ def handler(event: dict, context) -> dict:
         elif method == 'PUT':
             body = json.loads(event.get('body', '{}'))
             
-            for theme_key, color_value in body.items():
-                cursor.execute(
-                    'UPDATE site_theme SET color_value = %s, updated_at = CURRENT_TIMESTAMP WHERE theme_key = %s',
-                    (color_value, theme_key)
-                )
+            if not isinstance(body, dict) or not all(isinstance(v, str) for v in body.values()):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Expected an object of color strings'}),
+                    'isBase64Encoded': False
+                }
+            
+            # Один запрос на всё тело; неизменившиеся цвета не трогаются, новые ключи добавляются
+            cursor.execute('''
+                INSERT INTO site_theme (theme_key, color_value)
+                SELECT * FROM UNNEST(%s::varchar[], %s::varchar[])
+                ON CONFLICT (theme_key) DO UPDATE
+                SET color_value = EXCLUDED.color_value, updated_at = CURRENT_TIMESTAMP
+                WHERE site_theme.color_value IS DISTINCT FROM EXCLUDED.color_value
+                RETURNING theme_key, (xmax = 0) AS inserted
+            ''', (list(body.keys()), list(body.values())))
+            changed = cursor.fetchall()
+            
+            # Таблицу стилей пересобрал триггер site_theme_publish
+            cursor.execute('SELECT hash FROM site_theme_current WHERE id = 1')
+            current = cursor.fetchone()
             
             conn.commit()
             cursor.close()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -66,7 +135,13 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'success': True, 'message': 'Theme updated'}),
+                'body': json.dumps({
+                    'success': True,
+                    'message': 'Theme updated',
+                    'updated': [row['theme_key'] for row in changed if not row['inserted']],
+                    'created': [row['theme_key'] for row in changed if row['inserted']],
+                    'stylesheet': stylesheet_url(current['hash']) if current else None
+                }),
                 'isBase64Encoded': False
             }
         
@@ -88,3 +163,5 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
+    finally:
+        release_connection(conn)
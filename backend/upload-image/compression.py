@@ -0,0 +1,70 @@
+import base64
+import functools
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+
+def accepted_encodings(event: dict) -> set:
+    '''Кодировки из Accept-Encoding с ненулевым q'''
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'accept-encoding'), '') or ''
+    result = set()
+    for part in value.split(','):
+        name, _, options = part.strip().partition(';')
+        options = options.replace(' ', '')
+        if options.startswith('q='):
+            try:
+                if float(options[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            result.add(name.lower())
+    return result
+
+
+def compress_response(event: dict, response: dict) -> dict:
+    '''Сжать тело ответа gzip или brotli, если клиент это поддерживает'''
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+
+    raw = body.encode('utf-8')
+    if len(raw) < MIN_SIZE:
+        return response
+
+    encodings = accepted_encodings(event)
+    if brotli is not None and 'br' in encodings:
+        encoding, compressed = 'br', brotli.compress(raw, quality=5)
+    elif 'gzip' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(raw, compresslevel=6)
+    else:
+        return response
+
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+    # Сжатое представление отличается побайтно — валидатор становится слабым
+    if headers.get('ETag') and not headers['ETag'].startswith('W/'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+
+def with_compression(handler):
+    '''Декоратор обработчика: сжимает крупные ответы'''
+    @functools.wraps(handler)
+    def wrapper(event: dict, context) -> dict:
+        return compress_response(event, handler(event, context))
+    return wrapper
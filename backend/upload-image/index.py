@@ -1,14 +1,75 @@
 import json
 import os
 import base64
-import uuid
-import boto3
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from PIL import UnidentifiedImageError
+from compression import with_compression
+from storage import S3_BUCKET, get_s3, cdn_url, store_image
+from presign import create_upload, confirm_upload, variants_key, UPLOAD_PREFIX
 
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '8'))
+MAX_BATCH_IMAGES = 50
+
+def build_upload_variants(key: str) -> dict:
+    '''Собрать варианты для оригинала, загруженного напрямую в бакет; вызывается триггером бакета, а не из confirm'''
+    s3 = get_s3()
+    image_data = s3.get_object(Bucket=S3_BUCKET, Key=key)['Body'].read()
+    result = store_image(image_data)
+    s3.put_object(
+        Bucket=S3_BUCKET,
+        Key=variants_key(key),
+        Body=json.dumps({**result, 'source': key}).encode('utf-8'),
+        ContentType='application/json'
+    )
+    return result
+
+def storage_trigger_keys(event: dict) -> list:
+    '''Ключи новых загрузок из события триггера Object Storage'''
+    keys = []
+    for message in event.get('messages') or []:
+        key = (message.get('details') or {}).get('object_id') or ''
+        if key.startswith(UPLOAD_PREFIX):
+            keys.append(key)
+    return keys
+
+def decode_data_url(data_url: str) -> bytes:
+    if not data_url or not data_url.startswith('data:image/'):
+        raise ValueError('Invalid image format')
+    return base64.b64decode(data_url.split(',', 1)[1])
+
+def store_batch(images: list) -> list:
+    '''Загрузить несколько изображений параллельно; ошибка одного не мешает остальным'''
+    get_s3()
+    
+    def process(item):
+        index, data_url = item
+        try:
+            return {'index': index, **store_image(decode_data_url(data_url))}
+        except UnidentifiedImageError:
+            return {'index': index, 'error': 'Invalid image format'}
+        except Exception as e:
+            return {'index': index, 'error': str(e)}
+    
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(images))) as pool:
+        return list(pool.map(process, enumerate(images)))
+
+@with_compression
 def handler(event: dict, context) -> dict:
     '''API для загрузки изображений товаров на S3'''
     
+    # Триггер бакета на новые объекты: варианты собираются здесь, вне запроса браузера
+    if 'messages' in event:
+        results = []
+        for key in storage_trigger_keys(event):
+            try:
+                results.append({'key': key, **build_upload_variants(key)})
+            except Exception as e:
+                results.append({'key': key, 'error': str(e)})
+        return {'statusCode': 200, 'body': json.dumps({'results': results})}
+    
     method = event.get('httpMethod', 'POST')
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action')
     
     # CORS
     if method == 'OPTIONS':
@@ -32,7 +93,62 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        data = json.loads(event.get('body', '{}'))
+        data = json.loads(event.get('body') or '{}')
+        
+        if action in ('presign', 'confirm'):
+            # Прямая загрузка в бакет: байты изображения не проходят через функцию
+            try:
+                if action == 'presign':
+                    result = create_upload(get_s3(), S3_BUCKET, data.get('content_type', ''), int(data.get('size') or 0))
+                else:
+                    # Только HEAD: байты остаются в бакете, варианты собирает триггер на загрузку
+                    key = data.get('key', '')
+                    result = {**confirm_upload(get_s3(), S3_BUCKET, key), 'key': key, 'url': cdn_url(key)}
+            except (ValueError, TypeError) as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            except LookupError as e:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        if action == 'batch':
+            images = data.get('images') or []
+            if not isinstance(images, list) or not images or len(images) > MAX_BATCH_IMAGES:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': f'Expected 1 to {MAX_BATCH_IMAGES} images'}),
+                    'isBase64Encoded': False
+                }
+            
+            results = store_batch(images)
+            failed = sum(1 for r in results if 'error' in r)
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'results': results,
+                    'uploaded': len(results) - failed,
+                    'failed': failed
+                }, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
         base64_image = data.get('image', '')
         
         if not base64_image or not base64_image.startswith('data:image/'):
@@ -43,39 +159,24 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        # Извлечь MIME тип и данные
-        header, encoded = base64_image.split(',', 1)
-        mime_type = header.split(':')[1].split(';')[0]
-        extension = mime_type.split('/')[1]
-        
         # Декодировать base64
+        encoded = base64_image.split(',', 1)[1]
         image_data = base64.b64decode(encoded)
         
-        # Генерировать уникальное имя файла
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"products/{timestamp}_{uuid.uuid4().hex[:8]}.{extension}"
-        
-        # Загрузить на S3
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-        )
-        
-        s3.put_object(
-            Bucket='files',
-            Key=filename,
-            Body=image_data,
-            ContentType=mime_type
-        )
-        
-        # Сформировать CDN URL
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{filename}"
+        try:
+            result = store_image(image_data)
+        except UnidentifiedImageError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid image format'}),
+                'isBase64Encoded': False
+            }
         
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'url': cdn_url}, ensure_ascii=False),
+            'body': json.dumps(result, ensure_ascii=False),
             'isBase64Encoded': False
         }
     
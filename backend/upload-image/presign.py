@@ -0,0 +1,59 @@
+import os
+import uuid
+from datetime import datetime
+from botocore.exceptions import ClientError
+
+ALLOWED_CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', str(10 * 1024 * 1024)))
+PRESIGN_EXPIRES = int(os.environ.get('PRESIGN_EXPIRES', '600'))
+UPLOAD_PREFIX = 'products/uploads/'
+VARIANTS_PREFIX = 'products/upload-variants/'
+
+
+def create_upload(s3, bucket: str, content_type: str, size: int) -> dict:
+    '''Выдать presigned POST, чтобы браузер загрузил файл в бакет напрямую'''
+    extension = ALLOWED_CONTENT_TYPES.get(content_type)
+    if not extension:
+        raise ValueError('Unsupported content type')
+    if not size or size <= 0 or size > MAX_UPLOAD_SIZE:
+        raise ValueError(f'File size must be between 1 and {MAX_UPLOAD_SIZE} bytes')
+
+    key = f"{UPLOAD_PREFIX}{datetime.now().strftime('%Y%m%d')}/{uuid.uuid4().hex}.{extension}"
+    upload = s3.generate_presigned_post(
+        Bucket=bucket,
+        Key=key,
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            # Загрузить можно ровно заявленный размер, а не любой до лимита
+            ['content-length-range', size, size],
+        ],
+        ExpiresIn=PRESIGN_EXPIRES
+    )
+    return {'key': key, 'upload': upload, 'expires_in': PRESIGN_EXPIRES}
+
+
+def confirm_upload(s3, bucket: str, key: str) -> dict:
+    '''Проверить по HEAD, что объект загружен; повторный вызов вернёт то же самое'''
+    if not key or not key.startswith(UPLOAD_PREFIX) or '..' in key:
+        raise ValueError('Invalid upload key')
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound'):
+            raise LookupError('Upload not found')
+        raise
+    if head.get('ContentType') not in ALLOWED_CONTENT_TYPES or head.get('ContentLength', 0) > MAX_UPLOAD_SIZE:
+        raise ValueError('Unsupported upload')
+    return {'size': head.get('ContentLength'), 'content_type': head.get('ContentType')}
+
+
+def variants_key(key: str) -> str:
+    '''Где лежит результат сборки вариантов для загруженного оригинала; вне UPLOAD_PREFIX, чтобы не запускать триггер снова'''
+    return f"{VARIANTS_PREFIX}{key[len(UPLOAD_PREFIX):]}.json"
@@ -0,0 +1,3 @@
+-- Составные индексы для постраничной выборки каталога по курсору (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_products_category_created_id ON products(category, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_created_id ON products(created_at DESC, id DESC);
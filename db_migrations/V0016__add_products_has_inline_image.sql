@@ -0,0 +1,3 @@
+-- Признак встроенного base64-изображения, чтобы список товаров не читал image_url целиком
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS has_inline_image BOOLEAN GENERATED ALWAYS AS (COALESCE(image_url LIKE 'data:%', false)) STORED;
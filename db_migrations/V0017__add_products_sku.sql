@@ -0,0 +1,20 @@
+-- Стабильный артикул товара для массовой синхронизации прайсов
+ALTER TABLE products ADD COLUMN IF NOT EXISTS sku VARCHAR(100);
+
+UPDATE products SET sku = 'WS-' || id WHERE sku IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_products_sku ON products(sku);
+
+-- Товары, созданные без артикула, получают его автоматически
+CREATE OR REPLACE FUNCTION products_default_sku() RETURNS trigger AS $$
+BEGIN
+    IF NEW.sku IS NULL THEN
+        NEW.sku := 'WS-' || NEW.id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_products_default_sku
+    BEFORE INSERT ON products
+    FOR EACH ROW EXECUTE FUNCTION products_default_sku();
@@ -0,0 +1,16 @@
+-- Полнотекстовый поиск по названию и описаниям товаров
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(name, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(short_description, '')), 'B') ||
+        setweight(to_tsvector('russian', COALESCE(full_description, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_search ON products USING GIN (search_vector);
+
+-- Фильтрация по характеристикам (features @> '{...}')
+CREATE INDEX IF NOT EXISTS idx_products_features ON products USING GIN (features jsonb_path_ops);
+
+-- Диапазоны цен и скидки
+CREATE INDEX IF NOT EXISTS idx_products_price ON products(price);
+CREATE INDEX IF NOT EXISTS idx_products_on_sale ON products(discount) WHERE discount > 0;
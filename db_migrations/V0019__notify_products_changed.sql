@@ -0,0 +1,11 @@
+-- Уведомление тёплых инстансов об изменениях каталога, включая правки из миграций и psql
+CREATE OR REPLACE FUNCTION notify_products_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('products_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_products_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_products_changed();
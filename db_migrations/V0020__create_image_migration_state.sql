@@ -0,0 +1,19 @@
+-- Прогресс переноса встроенных base64-изображений товаров в объектное хранилище
+CREATE TABLE IF NOT EXISTS image_migration_state (
+    name VARCHAR(100) PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    migrated_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS image_migration_failures (
+    product_id INTEGER PRIMARY KEY,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO image_migration_state (name) VALUES ('products') ON CONFLICT (name) DO NOTHING;
+
+-- Частичный индекс для выборки строк, которые ещё нужно перенести
+CREATE INDEX IF NOT EXISTS idx_products_inline_image ON products(id) WHERE has_inline_image;
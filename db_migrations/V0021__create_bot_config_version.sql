@@ -0,0 +1,8 @@
+-- Версия настроек бота: тёплые инстансы перечитывают bot_settings и bot_messages только при её смене
+CREATE TABLE IF NOT EXISTS bot_config_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO bot_config_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
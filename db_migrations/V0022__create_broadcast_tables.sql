@@ -0,0 +1,35 @@
+-- Рассылки по пользователям Telegram и подписчикам newsletter
+CREATE TABLE IF NOT EXISTS broadcast_campaigns (
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(255),
+    message_text TEXT NOT NULL,
+    email_subject VARCHAR(255),
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Очередь получателей кампании: статус, попытки и время следующей попытки по каждому
+CREATE TABLE IF NOT EXISTS broadcast_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES broadcast_campaigns(id),
+    channel VARCHAR(20) NOT NULL,
+    recipient VARCHAR(255) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    sent_at TIMESTAMP,
+    UNIQUE (campaign_id, channel, recipient)
+);
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_outbox_queue
+    ON broadcast_outbox(campaign_id, next_attempt_at, id)
+    WHERE status IN ('pending', 'retry', 'sending');
+
+-- Пользователи, заблокировавшие бота, исключаются из следующих рассылок
+CREATE TABLE IF NOT EXISTS telegram_blocked_users (
+    telegram_user_id VARCHAR(100) PRIMARY KEY,
+    blocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
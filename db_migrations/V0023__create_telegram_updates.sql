@@ -0,0 +1,17 @@
+-- Очередь входящих update от Telegram; update_id защищает от повторной доставки
+CREATE TABLE IF NOT EXISTS telegram_updates (
+    update_id BIGINT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    last_error TEXT,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_pending
+    ON telegram_updates(update_id)
+    WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_processed_at
+    ON telegram_updates(processed_at)
+    WHERE processed_at IS NOT NULL;
@@ -0,0 +1,83 @@
+-- Сводка по категориям для /catalog в боте и счётчиков на витрине
+CREATE TABLE IF NOT EXISTS category_summary (
+    category VARCHAR(100) PRIMARY KEY,
+    product_count INTEGER NOT NULL DEFAULT 0,
+    in_stock_count INTEGER NOT NULL DEFAULT 0,
+    min_price INTEGER,
+    new_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Пересчитать только затронутые категории (по индексу на category)
+CREATE OR REPLACE FUNCTION refresh_category_summary(categories TEXT[]) RETURNS void AS $$
+BEGIN
+    IF categories IS NULL OR cardinality(categories) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Блокировка строк сводки сериализует параллельные пересчёты одной категории;
+    -- следующий запрос берёт свежий снимок и видит уже закоммиченные изменения
+    PERFORM 1 FROM category_summary WHERE category = ANY(categories) ORDER BY category FOR UPDATE;
+
+    INSERT INTO category_summary (category, product_count, in_stock_count, min_price, new_count, updated_at)
+    SELECT c.category,
+           COUNT(p.id),
+           COUNT(p.id) FILTER (WHERE p.in_stock),
+           MIN(p.price) FILTER (WHERE p.in_stock),
+           COUNT(p.id) FILTER (WHERE p.in_stock AND p.is_new),
+           CURRENT_TIMESTAMP
+    FROM unnest(categories) AS c(category)
+    LEFT JOIN products p ON p.category = c.category
+    GROUP BY c.category
+    ON CONFLICT (category) DO UPDATE
+    SET product_count = EXCLUDED.product_count,
+        in_stock_count = EXCLUDED.in_stock_count,
+        min_price = EXCLUDED.min_price,
+        new_count = EXCLUDED.new_count,
+        updated_at = EXCLUDED.updated_at;
+
+    DELETE FROM category_summary WHERE category = ANY(categories) AND product_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION products_category_summary_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_category_summary(ARRAY(SELECT DISTINCT category FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_category_summary(ARRAY(SELECT DISTINCT category FROM old_rows));
+    ELSE
+        -- Правка описаний и картинок сводку не меняет
+        PERFORM refresh_category_summary(ARRAY(
+            SELECT DISTINCT c.category
+            FROM old_rows o
+            JOIN new_rows n ON n.id = o.id
+            CROSS JOIN LATERAL (VALUES (o.category), (n.category)) AS c(category)
+            WHERE (o.category, o.price, o.in_stock, o.is_new) IS DISTINCT FROM (n.category, n.price, n.in_stock, n.is_new)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переходные таблицы допускаются только для триггера на одно событие
+DROP TRIGGER IF EXISTS products_category_summary_insert ON products;
+CREATE TRIGGER products_category_summary_insert
+    AFTER INSERT ON products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_category_summary_trigger();
+
+DROP TRIGGER IF EXISTS products_category_summary_update ON products;
+CREATE TRIGGER products_category_summary_update
+    AFTER UPDATE ON products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_category_summary_trigger();
+
+DROP TRIGGER IF EXISTS products_category_summary_delete ON products;
+CREATE TRIGGER products_category_summary_delete
+    AFTER DELETE ON products
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_category_summary_trigger();
+
+-- Начальное заполнение
+SELECT refresh_category_summary(ARRAY(SELECT DISTINCT category FROM products));
@@ -0,0 +1,96 @@
+-- Условия акций в виде, пригодном для расчёта: процент, категория (NULL — весь магазин) и срок
+ALTER TABLE promotions ADD COLUMN IF NOT EXISTS percent_off INTEGER;
+ALTER TABLE promotions ADD COLUMN IF NOT EXISTS category VARCHAR(100);
+ALTER TABLE promotions ADD COLUMN IF NOT EXISTS ends_at TIMESTAMP;
+
+-- Перенести процент из текстового поля discount вида "-20%"
+UPDATE promotions
+SET percent_off = substring(discount FROM '(\d+)\s*%')::INTEGER
+WHERE percent_off IS NULL AND discount ~ '\d+\s*%';
+
+-- Версия корзины растёт при любом изменении её позиций
+ALTER TABLE carts ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION bump_cart_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE carts SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (
+        SELECT cart_id FROM new_rows
+        UNION
+        SELECT cart_id FROM old_rows
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_cart_version_insert() RETURNS trigger AS $$
+BEGIN
+    UPDATE carts SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (SELECT cart_id FROM new_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_cart_version_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE carts SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (SELECT cart_id FROM old_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cart_items_version_insert ON cart_items;
+CREATE TRIGGER cart_items_version_insert
+    AFTER INSERT ON cart_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_cart_version_insert();
+
+DROP TRIGGER IF EXISTS cart_items_version_update ON cart_items;
+CREATE TRIGGER cart_items_version_update
+    AFTER UPDATE ON cart_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_cart_version();
+
+DROP TRIGGER IF EXISTS cart_items_version_delete ON cart_items;
+CREATE TRIGGER cart_items_version_delete
+    AFTER DELETE ON cart_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_cart_version_delete();
+
+-- Общая версия цен: меняется при правке товаров или акций и сбрасывает все расчёты
+CREATE TABLE IF NOT EXISTS pricing_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO pricing_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_pricing_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE pricing_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_pricing_version ON products;
+CREATE TRIGGER products_pricing_version
+    AFTER INSERT OR UPDATE OR DELETE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_pricing_version();
+
+DROP TRIGGER IF EXISTS promotions_pricing_version ON promotions;
+CREATE TRIGGER promotions_pricing_version
+    AFTER INSERT OR UPDATE OR DELETE ON promotions
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_pricing_version();
+
+-- Рассчитанные итоги корзин; строка актуальна, пока совпадают обе версии
+CREATE TABLE IF NOT EXISTS cart_pricing (
+    cart_id INTEGER PRIMARY KEY,
+    cart_version INTEGER NOT NULL,
+    pricing_version BIGINT NOT NULL,
+    items JSONB NOT NULL,
+    subtotal DECIMAL(12, 2) NOT NULL,
+    discount_total DECIMAL(12, 2) NOT NULL,
+    total DECIMAL(12, 2) NOT NULL,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,67 @@
+-- page_views становится секционированной по месяцам: запись в «горячую» секцию,
+-- удаление старой истории — DROP секции вместо DELETE и VACUUM
+ALTER TABLE page_views RENAME TO page_views_legacy;
+ALTER INDEX IF EXISTS idx_page_views_created_at RENAME TO idx_page_views_legacy_created_at;
+
+CREATE TABLE page_views (
+    id BIGSERIAL,
+    page_url VARCHAR(500) NOT NULL,
+    user_ip VARCHAR(45),
+    user_agent TEXT,
+    referrer VARCHAR(500),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX idx_page_views_created_at ON page_views(created_at);
+
+-- Создать секцию месяца, если её ещё нет; возвращает имя секции
+CREATE OR REPLACE FUNCTION ensure_page_views_partition(month_start DATE) RETURNS TEXT AS $$
+DECLARE
+    from_date DATE := date_trunc('month', month_start)::DATE;
+    partition_name TEXT := 'page_views_' || to_char(date_trunc('month', month_start), 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF page_views FOR VALUES FROM (%L) TO (%L)',
+            partition_name, from_date, (from_date + INTERVAL '1 month')::DATE
+        );
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Удалить секции, целиком лежащие раньше cutoff; возвращает число удалённых
+CREATE OR REPLACE FUNCTION drop_page_views_partitions_before(cutoff DATE) RETURNS INTEGER AS $$
+DECLARE
+    partition RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    FOR partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'page_views'::regclass
+          AND c.relname ~ '^page_views_\d{4}_\d{2}$'
+          AND (to_date(substring(c.relname FROM '\d{4}_\d{2}$'), 'YYYY_MM') + INTERVAL '1 month') <= cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', partition.relname);
+        dropped := dropped + 1;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секции под существующую историю, текущий и следующий месяц
+SELECT ensure_page_views_partition(month::DATE)
+FROM generate_series(
+    date_trunc('month', LEAST(COALESCE((SELECT MIN(created_at) FROM page_views_legacy), CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)),
+    date_trunc('month', CURRENT_TIMESTAMP + INTERVAL '1 month'),
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO page_views (page_url, user_ip, user_agent, referrer, created_at)
+SELECT page_url, user_ip, user_agent, referrer, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM page_views_legacy;
+
+DROP TABLE page_views_legacy;
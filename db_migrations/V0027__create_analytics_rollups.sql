@@ -0,0 +1,93 @@
+-- Агрегаты для дашборда аналитики: читаются за постоянное время независимо от объёма истории
+
+-- Просмотры по страницам по часам
+CREATE TABLE IF NOT EXISTS page_views_hourly (
+    hour TIMESTAMP NOT NULL,
+    page_url VARCHAR(500) NOT NULL,
+    views BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, page_url)
+);
+
+-- Просмотры и уникальные IP по дням
+CREATE TABLE IF NOT EXISTS page_views_daily (
+    day DATE PRIMARY KEY,
+    views BIGINT NOT NULL DEFAULT 0,
+    unique_ips BIGINT NOT NULL DEFAULT 0
+);
+
+-- Какие IP уже учтены за день; хранится ограниченное число дней
+CREATE TABLE IF NOT EXISTS page_view_daily_ips (
+    day DATE NOT NULL,
+    user_ip VARCHAR(45) NOT NULL,
+    PRIMARY KEY (day, user_ip)
+);
+
+-- Все когда-либо встречавшиеся IP для общего числа уникальных посетителей
+CREATE TABLE IF NOT EXISTS page_view_visitors (
+    user_ip VARCHAR(45) PRIMARY KEY,
+    first_seen TIMESTAMP NOT NULL
+);
+
+-- Просмотры по страницам за всё время, для топа страниц
+CREATE TABLE IF NOT EXISTS page_views_by_url (
+    page_url VARCHAR(500) PRIMARY KEY,
+    views BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_page_views_by_url_views ON page_views_by_url(views DESC);
+
+-- Источники переходов по дням
+CREATE TABLE IF NOT EXISTS referrers_daily (
+    day DATE NOT NULL,
+    referrer VARCHAR(500) NOT NULL,
+    views BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, referrer)
+);
+
+-- Отметка обработанных просмотров и общие счётчики
+CREATE TABLE IF NOT EXISTS analytics_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_page_view_id BIGINT NOT NULL DEFAULT 0,
+    total_views BIGINT NOT NULL DEFAULT 0,
+    unique_ips BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO analytics_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+-- Заказы и выручка по дням и статусам; заказы меняют статус, поэтому агрегат ведёт триггер
+CREATE TABLE IF NOT EXISTS orders_daily (
+    day DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    orders BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status)
+);
+
+CREATE OR REPLACE FUNCTION orders_daily_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE orders_daily
+        SET orders = orders - 1, revenue = revenue - OLD.total_price
+        WHERE day = COALESCE(OLD.created_at, CURRENT_TIMESTAMP)::DATE AND status = COALESCE(OLD.status, 'new');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO orders_daily (day, status, orders, revenue)
+        VALUES (COALESCE(NEW.created_at, CURRENT_TIMESTAMP)::DATE, COALESCE(NEW.status, 'new'), 1, NEW.total_price)
+        ON CONFLICT (day, status) DO UPDATE
+        SET orders = orders_daily.orders + 1, revenue = orders_daily.revenue + EXCLUDED.revenue;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orders_daily_rollup ON orders;
+CREATE TRIGGER orders_daily_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF status, total_price, created_at ON orders
+    FOR EACH ROW EXECUTE FUNCTION orders_daily_apply();
+
+INSERT INTO orders_daily (day, status, orders, revenue)
+SELECT COALESCE(created_at, CURRENT_TIMESTAMP)::DATE, COALESCE(status, 'new'), COUNT(*), SUM(total_price)
+FROM orders
+GROUP BY 1, 2
+ON CONFLICT (day, status) DO NOTHING;
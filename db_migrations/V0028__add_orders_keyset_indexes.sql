@@ -0,0 +1,11 @@
+-- Индексы под список заказов: фильтр по статусу и keyset-пагинация по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_id ON orders(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_created_id ON orders(created_at DESC, id DESC);
+
+-- Поиск по началу телефона и email
+CREATE INDEX IF NOT EXISTS idx_orders_user_phone_prefix ON orders(user_phone text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_orders_user_email_prefix ON orders(lower(user_email) text_pattern_ops);
+
+-- Одиночные индексы покрываются составными
+DROP INDEX IF EXISTS idx_orders_status;
+DROP INDEX IF EXISTS idx_orders_created_at;
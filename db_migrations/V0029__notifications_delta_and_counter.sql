@@ -0,0 +1,64 @@
+-- Лента уведомлений: индекс под сортировку и счётчик непрочитанных, который ведёт триггер
+CREATE INDEX IF NOT EXISTS idx_admin_notifications_created_id ON admin_notifications(created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS admin_notification_counters (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    unread BIGINT NOT NULL DEFAULT 0,
+    last_id INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO admin_notification_counters (id, unread, last_id)
+SELECT 1,
+       (SELECT COUNT(*) FROM admin_notifications WHERE NOT is_read),
+       (SELECT COALESCE(MAX(id), 0) FROM admin_notifications)
+ON CONFLICT (id) DO UPDATE SET unread = EXCLUDED.unread, last_id = EXCLUDED.last_id;
+
+CREATE OR REPLACE FUNCTION admin_notifications_count() RETURNS trigger AS $$
+DECLARE
+    delta BIGINT := 0;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NOT EXISTS (SELECT 1 FROM new_rows) THEN
+            RETURN NULL;
+        END IF;
+        SELECT COUNT(*) FILTER (WHERE NOT COALESCE(is_read, FALSE)) INTO delta FROM new_rows;
+        UPDATE admin_notification_counters
+        SET unread = unread + delta,
+            last_id = GREATEST(last_id, (SELECT MAX(id) FROM new_rows))
+        WHERE id = 1;
+        -- Ожидающие long-poll запросы просыпаются сразу
+        PERFORM pg_notify('admin_notifications', (SELECT MAX(id) FROM new_rows)::TEXT);
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT COUNT(*) FILTER (WHERE NOT COALESCE(n.is_read, FALSE)) - COUNT(*) FILTER (WHERE NOT COALESCE(o.is_read, FALSE))
+        INTO delta
+        FROM old_rows o JOIN new_rows n ON n.id = o.id;
+        IF delta <> 0 THEN
+            UPDATE admin_notification_counters SET unread = unread + delta WHERE id = 1;
+        END IF;
+    ELSE
+        SELECT -COUNT(*) FILTER (WHERE NOT COALESCE(is_read, FALSE)) INTO delta FROM old_rows;
+        IF delta <> 0 THEN
+            UPDATE admin_notification_counters SET unread = unread + delta WHERE id = 1;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS admin_notifications_count_insert ON admin_notifications;
+CREATE TRIGGER admin_notifications_count_insert
+    AFTER INSERT ON admin_notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_notifications_count();
+
+DROP TRIGGER IF EXISTS admin_notifications_count_update ON admin_notifications;
+CREATE TRIGGER admin_notifications_count_update
+    AFTER UPDATE ON admin_notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_notifications_count();
+
+DROP TRIGGER IF EXISTS admin_notifications_count_delete ON admin_notifications;
+CREATE TRIGGER admin_notifications_count_delete
+    AFTER DELETE ON admin_notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_notifications_count();
@@ -0,0 +1,52 @@
+-- Готовая таблица стилей темы: собирается при сохранении и отдаётся по URL с хэшем содержимого
+CREATE TABLE IF NOT EXISTS site_theme_stylesheets (
+    hash VARCHAR(16) PRIMARY KEY,
+    css TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Указатель на актуальную версию; старые версии остаются доступны по своим URL
+CREATE TABLE IF NOT EXISTS site_theme_current (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    hash VARCHAR(16) NOT NULL REFERENCES site_theme_stylesheets(hash),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION publish_site_theme_css() RETURNS VARCHAR AS $$
+DECLARE
+    stylesheet TEXT;
+    stylesheet_hash VARCHAR(16);
+BEGIN
+    -- В CSS попадают только безопасные имена и значения переменных
+    SELECT ':root {' || COALESCE(string_agg(E'\n  --' || theme_key || ': ' || color_value || ';', '' ORDER BY theme_key), '') || E'\n}\n'
+    INTO stylesheet
+    FROM site_theme
+    WHERE theme_key ~ '^[a-z0-9-]+$' AND color_value !~ '[;{}<>\\]';
+
+    stylesheet_hash := left(encode(sha256(convert_to(stylesheet, 'UTF8')), 'hex'), 16);
+
+    INSERT INTO site_theme_stylesheets (hash, css) VALUES (stylesheet_hash, stylesheet)
+    ON CONFLICT (hash) DO NOTHING;
+
+    INSERT INTO site_theme_current (id, hash) VALUES (1, stylesheet_hash)
+    ON CONFLICT (id) DO UPDATE SET hash = EXCLUDED.hash, updated_at = CURRENT_TIMESTAMP
+    WHERE site_theme_current.hash IS DISTINCT FROM EXCLUDED.hash;
+
+    RETURN stylesheet_hash;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION site_theme_publish_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM publish_site_theme_css();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Любое изменение темы (PUT из админки или миграция) пересобирает таблицу стилей
+DROP TRIGGER IF EXISTS site_theme_publish ON site_theme;
+CREATE TRIGGER site_theme_publish
+    AFTER INSERT OR UPDATE OR DELETE ON site_theme
+    FOR EACH STATEMENT EXECUTE FUNCTION site_theme_publish_trigger();
+
+SELECT publish_site_theme_css();
@@ -0,0 +1,26 @@
+-- Селектор :root:root сильнее :root и .dark из бандла, как прежние inline-переменные
+CREATE OR REPLACE FUNCTION publish_site_theme_css() RETURNS VARCHAR AS $$
+DECLARE
+    stylesheet TEXT;
+    stylesheet_hash VARCHAR(16);
+BEGIN
+    -- В CSS попадают только безопасные имена и значения переменных
+    SELECT ':root:root {' || COALESCE(string_agg(E'\n  --' || theme_key || ': ' || color_value || ';', '' ORDER BY theme_key), '') || E'\n}\n'
+    INTO stylesheet
+    FROM site_theme
+    WHERE theme_key ~ '^[a-z0-9-]+$' AND color_value !~ '[;{}<>\\]';
+
+    stylesheet_hash := left(encode(sha256(convert_to(stylesheet, 'UTF8')), 'hex'), 16);
+
+    INSERT INTO site_theme_stylesheets (hash, css) VALUES (stylesheet_hash, stylesheet)
+    ON CONFLICT (hash) DO NOTHING;
+
+    INSERT INTO site_theme_current (id, hash) VALUES (1, stylesheet_hash)
+    ON CONFLICT (id) DO UPDATE SET hash = EXCLUDED.hash, updated_at = CURRENT_TIMESTAMP
+    WHERE site_theme_current.hash IS DISTINCT FROM EXCLUDED.hash;
+
+    RETURN stylesheet_hash;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT publish_site_theme_css();
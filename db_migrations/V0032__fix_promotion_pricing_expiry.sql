@@ -0,0 +1,12 @@
+-- Расчёт корзины устаревает, когда истекает самая ранняя из учтённых акций
+ALTER TABLE cart_pricing ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+
+-- Процент, разобранный из текста discount, не применяется сам по себе: у таких акций нет
+-- ни категории, ни срока (valid_until — свободный текст), и они действовали бы на весь магазин бессрочно.
+-- Условия расчёта задаются явно через percent_off, category и ends_at
+UPDATE promotions
+SET percent_off = NULL
+WHERE percent_off IS NOT NULL
+  AND category IS NULL
+  AND ends_at IS NULL
+  AND percent_off = substring(discount FROM '(\d+)\s*%')::INTEGER;
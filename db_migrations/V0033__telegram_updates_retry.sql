@@ -0,0 +1,10 @@
+-- Update считается обработанным только после успешной отправки ответов;
+-- неудачные повторяются с паузой, после MAX_ATTEMPTS остаются в статусе failed
+ALTER TABLE telegram_updates ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE telegram_updates ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE telegram_updates ADD COLUMN IF NOT EXISTS locked_at TIMESTAMP;
+
+DROP INDEX IF EXISTS idx_telegram_updates_pending;
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_due
+    ON telegram_updates(next_attempt_at, update_id)
+    WHERE status IN ('pending', 'retry', 'processing');
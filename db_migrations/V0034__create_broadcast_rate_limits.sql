@@ -0,0 +1,6 @@
+-- Общее для всех воркеров расписание отправки по каналу: воркер занимает слоты для порции,
+-- сдвигая next_slot_at, и рассылает её не раньше полученного времени
+CREATE TABLE IF NOT EXISTS broadcast_rate_limits (
+    channel VARCHAR(20) PRIMARY KEY,
+    next_slot_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,20 @@
+-- Артикул по умолчанию берётся из последовательности в зарезервированном пространстве AUTO-:
+-- 'WS-' || id мог совпасть с артикулом, уже пришедшим из прайса
+CREATE SEQUENCE IF NOT EXISTS products_auto_sku_seq;
+
+CREATE OR REPLACE FUNCTION products_default_sku() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.sku IS NULL THEN
+        NEW.sku := 'AUTO-' || nextval('products_auto_sku_seq');
+    ELSIF NEW.sku LIKE 'AUTO-%' AND (TG_OP = 'INSERT' OR NEW.sku IS DISTINCT FROM OLD.sku) THEN
+        RAISE EXCEPTION 'Артикулы с префиксом AUTO- назначаются автоматически: %', NEW.sku
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_default_sku ON products;
+CREATE TRIGGER trg_products_default_sku
+    BEFORE INSERT OR UPDATE OF sku ON products
+    FOR EACH ROW EXECUTE FUNCTION products_default_sku();
@@ -0,0 +1,2 @@
+-- Ответы на update сохраняются до отправки; при повторе уходят только недоставленные
+ALTER TABLE telegram_updates ADD COLUMN IF NOT EXISTS replies JSONB;
@@ -0,0 +1,19 @@
+-- Время последнего выбывания строк из выборок каталога (удаление или смена категории):
+-- max(updated_at) оставшихся строк его не отражает, а If-Modified-Since сверяет только время
+CREATE TABLE IF NOT EXISTS products_catalog_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_removed_at TIMESTAMPTZ
+);
+
+INSERT INTO products_catalog_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION products_mark_removed() RETURNS trigger AS $$
+BEGIN
+    UPDATE products_catalog_state SET last_removed_at = CURRENT_TIMESTAMP WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_products_mark_removed
+    AFTER DELETE OR TRUNCATE OR UPDATE OF category ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION products_mark_removed();
@@ -0,0 +1,5 @@
+-- Курсорная пагинация сравнивает (created_at, id): NULL выпадал из сравнения и ломал курсор
+UPDATE products SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL;
+
+ALTER TABLE products ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE products ALTER COLUMN created_at SET NOT NULL;
@@ -9,6 +9,7 @@ import { AuthProvider } from "./contexts/AuthContext";
 import { ThemeProvider } from "./contexts/ThemeContext";
 
 import ProtectedRoute from "./components/ProtectedRoute";
+import { usePageViewTracking } from "./hooks/usePageViewTracking";
 import Index from "./pages/Index";
 import Login from "./pages/Login";
 import Catalog from "./pages/Catalog";
@@ -25,6 +26,11 @@ import NotFound from "./pages/NotFound";
 
 const queryClient = new QueryClient();
 
+const PageViewTracker = () => {
+  usePageViewTracking();
+  return null;
+};
+
 const App = () => (
   <QueryClientProvider client={queryClient}>
     <ThemeProvider>
@@ -34,6 +40,7 @@ const App = () => (
             <Toaster />
             <Sonner />
             <BrowserRouter>
+          <PageViewTracker />
           <Routes>
             <Route path="/" element={<Index />} />
             <Route path="/catalog" element={<Catalog />} />
@@ -3,6 +3,9 @@ import { Button } from '@/components/ui/button';
 import { Label } from '@/components/ui/label';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import funcUrls from '../../backend/func2url.json';
+
+const UPLOAD_API_URL = funcUrls['upload-image'];
 
 interface ImageUploaderProps {
   value: string;
@@ -39,33 +42,48 @@ export default function ImageUploader({ value, onChange, label = 'Изображ
     }
 
     setUploading(true);
+    setPreview(URL.createObjectURL(file));
 
     try {
-      const reader = new FileReader();
-      reader.onload = async (event) => {
-        const base64 = event.target?.result as string;
-        setPreview(base64);
-        
-        // Загрузить на S3 через API
-        const uploadResponse = await fetch('https://functions.poehali.dev/defc8cb0-8d1b-451b-86c4-fe4dcda5dc9e', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ image: base64 }),
-        });
-        
-        if (!uploadResponse.ok) {
-          throw new Error('Не удалось загрузить изображение на сервер');
-        }
-        
-        const { url } = await uploadResponse.json();
-        onChange(url);
-        
-        toast({
-          title: 'Успешно',
-          description: 'Изображение загружено',
-        });
-      };
-      reader.readAsDataURL(file);
+      // Получить presigned POST и загрузить файл прямо в хранилище
+      const presignResponse = await fetch(`${UPLOAD_API_URL}?action=presign`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ content_type: file.type, size: file.size }),
+      });
+      if (!presignResponse.ok) {
+        throw new Error('Не удалось подготовить загрузку');
+      }
+      const { key, upload } = await presignResponse.json();
+
+      const formData = new FormData();
+      Object.entries(upload.fields as Record<string, string>).forEach(([name, value]) => {
+        formData.append(name, value);
+      });
+      formData.append('file', file);
+
+      const storageResponse = await fetch(upload.url, { method: 'POST', body: formData });
+      if (!storageResponse.ok) {
+        throw new Error('Не удалось загрузить изображение на сервер');
+      }
+
+      const confirmResponse = await fetch(`${UPLOAD_API_URL}?action=confirm`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ key }),
+      });
+      if (!confirmResponse.ok) {
+        throw new Error('Не удалось подтвердить загрузку');
+      }
+
+      const { url } = await confirmResponse.json();
+      setPreview(url);
+      onChange(url);
+
+      toast({
+        title: 'Успешно',
+        description: 'Изображение загружено',
+      });
     } catch (error) {
       toast({
         title: 'Ошибка',
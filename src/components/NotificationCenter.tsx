@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import {
@@ -21,30 +21,59 @@ interface Notification {
 
 export default function NotificationCenter() {
   const [notifications, setNotifications] = useState<Notification[]>([]);
+  const [unreadCount, setUnreadCount] = useState(0);
   const [open, setOpen] = useState(false);
+  const lastIdRef = useRef<number | null>(null);
   const apiUrl = funcUrls['site-content'];
 
   useEffect(() => {
-    loadNotifications();
-    const interval = setInterval(loadNotifications, 30000);
-    return () => clearInterval(interval);
+    // Сначала полный список, затем long-poll только за новыми уведомлениями
+    // После ошибки пауза растёт от 2 секунд до минуты и сбрасывается первым успешным ответом
+    let active = true;
+    let timeout: ReturnType<typeof setTimeout> | null = null;
+    let failures = 0;
+
+    const poll = async () => {
+      const ok = await loadNotifications();
+      if (!active) return;
+      failures = ok ? 0 : failures + 1;
+      timeout = setTimeout(poll, ok ? 0 : Math.min(60000, 2000 * 2 ** (failures - 1)));
+    };
+    poll();
+
+    return () => {
+      active = false;
+      if (timeout) clearTimeout(timeout);
+    };
   }, []);
 
-  const loadNotifications = async () => {
+  const loadNotifications = async (): Promise<boolean> => {
     try {
       if (!apiUrl) {
         setNotifications([]);
-        return;
+        return false;
       }
-      const res = await fetch(`${apiUrl}?action=notifications`);
+      const sinceId = lastIdRef.current;
+      const query = sinceId === null ? '' : `&since_id=${sinceId}&wait=25`;
+      const res = await fetch(`${apiUrl}?action=notifications${query}`);
       if (!res.ok) {
         throw new Error(`HTTP ${res.status}`);
       }
       const data = await res.json();
-      setNotifications(data.notifications || []);
+      const incoming: Notification[] = data.notifications || [];
+
+      if (sinceId === null) {
+        setNotifications(incoming);
+      } else if (incoming.length > 0) {
+        // Новые приходят по возрастанию id, а список показывается от новых к старым
+        setNotifications(prev => [...[...incoming].reverse(), ...prev].slice(0, 50));
+      }
+      setUnreadCount(data.unread_count ?? 0);
+      lastIdRef.current = Math.max(data.last_id ?? 0, sinceId ?? 0);
+      return true;
     } catch (error) {
       console.error('Error loading notifications:', error);
-      setNotifications([]);
+      return false;
     }
   };
 
@@ -55,14 +84,15 @@ export default function NotificationCenter() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ id: notifId })
       });
-      loadNotifications();
+      if (notifications.some(n => n.id === notifId && !n.is_read)) {
+        setUnreadCount(count => Math.max(0, count - 1));
+      }
+      setNotifications(prev => prev.map(n => n.id === notifId ? { ...n, is_read: true } : n));
     } catch (error) {
       console.error('Error marking notification:', error);
     }
   };
 
-  const unreadCount = notifications?.filter(n => !n.is_read).length || 0;
-
   return (
     <Popover open={open} onOpenChange={setOpen}>
       <PopoverTrigger asChild>
@@ -0,0 +1,62 @@
+import { useEffect } from 'react';
+import { useLocation } from 'react-router-dom';
+import funcUrls from '../../backend/func2url.json';
+
+const ANALYTICS_API_URL = `${funcUrls['site-content']}?action=page-views`;
+const FLUSH_SIZE = 20;
+const FLUSH_INTERVAL = 15000;
+
+interface PageViewEvent {
+  page_url: string;
+  referrer: string | null;
+  ts: number;
+}
+
+// Просмотры копятся в буфере и уходят пачкой: по размеру, по таймеру или при уходе со страницы
+let buffer: PageViewEvent[] = [];
+let timer: ReturnType<typeof setTimeout> | null = null;
+
+function flush(useBeacon = false) {
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  if (buffer.length === 0) return;
+
+  const body = JSON.stringify({ events: buffer });
+  buffer = [];
+
+  if (useBeacon && navigator.sendBeacon) {
+    navigator.sendBeacon(ANALYTICS_API_URL, body);
+    return;
+  }
+  fetch(ANALYTICS_API_URL, { method: 'POST', body, keepalive: true }).catch(() => {
+    // Аналитика не должна мешать работе сайта
+  });
+}
+
+function track(pageUrl: string) {
+  buffer.push({ page_url: pageUrl, referrer: document.referrer || null, ts: Date.now() });
+  if (buffer.length >= FLUSH_SIZE) {
+    flush();
+  } else if (!timer) {
+    timer = setTimeout(() => flush(), FLUSH_INTERVAL);
+  }
+}
+
+export function usePageViewTracking() {
+  const location = useLocation();
+
+  useEffect(() => {
+    const onHide = () => {
+      if (document.visibilityState === 'hidden') flush(true);
+    };
+    document.addEventListener('visibilitychange', onHide);
+    return () => document.removeEventListener('visibilitychange', onHide);
+  }, []);
+
+  useEffect(() => {
+    if (location.pathname.startsWith('/admin')) return;
+    track(location.pathname);
+  }, [location.pathname]);
+}
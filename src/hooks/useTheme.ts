@@ -1,25 +1,26 @@
 import { useEffect } from 'react';
 
 const THEME_API_URL = 'https://functions.poehali.dev/ede28564-2e57-4545-aebb-ff117c81a6f4';
+const THEME_LINK_ID = 'site-theme';
+
+// Подключить таблицу стилей темы; после сохранения в админке передаётся путь новой версии
+export function applyThemeStylesheet(stylesheetPath = '?format=css') {
+  let link = document.getElementById(THEME_LINK_ID) as HTMLLinkElement | null;
+  if (!link) {
+    link = document.createElement('link');
+    link.id = THEME_LINK_ID;
+    link.rel = 'stylesheet';
+    document.head.appendChild(link);
+  }
+  const href = `${THEME_API_URL}${stylesheetPath}`;
+  if (link.href !== href) link.href = href;
+}
 
 export function useTheme() {
   useEffect(() => {
-    const loadTheme = async () => {
-      try {
-        const response = await fetch(THEME_API_URL);
-        if (!response.ok) return;
-        
-        const colors = await response.json();
-        
-        const root = document.documentElement;
-        Object.entries(colors).forEach(([key, value]) => {
-          root.style.setProperty(`--${key}`, value as string);
-        });
-      } catch (error) {
-        console.error('Failed to load theme:', error);
-      }
-    };
-
-    loadTheme();
+    // Обычно ссылка уже есть в index.html; браузер берёт CSS из кэша по хэшу
+    if (!document.getElementById(THEME_LINK_ID)) {
+      applyThemeStylesheet();
+    }
   }, []);
 }
@@ -67,7 +67,7 @@ export default function Admin() {
       const limit = 10;
       
       while (true) {
-        const response = await fetch(`${API_URL}?limit=${limit}&offset=${offset}`);
+        const response = await fetch(`${API_URL}?limit=${limit}&offset=${offset}&fields=full`);
         if (!response.ok) throw new Error('Failed to load products');
         const data = await response.json();
         const batch = Array.isArray(data) ? data : [];
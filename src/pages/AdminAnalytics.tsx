@@ -48,6 +48,7 @@ interface Notification {
 export default function AdminAnalytics() {
   const [analytics, setAnalytics] = useState<AnalyticsData | null>(null);
   const [orders, setOrders] = useState<Order[]>([]);
+  const [ordersCursor, setOrdersCursor] = useState<string | null>(null);
   const [notifications, setNotifications] = useState<Notification[]>([]);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState<'stats' | 'orders' | 'notifications'>('stats');
@@ -69,6 +70,7 @@ export default function AdminAnalytics() {
         const res = await fetch(`${apiUrl}?action=orders`);
         const data = await res.json();
         setOrders(data.orders);
+        setOrdersCursor(data.next_cursor || null);
       } else if (activeTab === 'notifications') {
         const res = await fetch(`${apiUrl}?action=notifications`);
         const data = await res.json();
@@ -80,6 +82,18 @@ export default function AdminAnalytics() {
     setLoading(false);
   };
 
+  const loadMoreOrders = async () => {
+    if (!ordersCursor) return;
+    try {
+      const res = await fetch(`${apiUrl}?action=orders&after=${encodeURIComponent(ordersCursor)}`);
+      const data = await res.json();
+      setOrders(prev => [...prev, ...(data.orders || [])]);
+      setOrdersCursor(data.next_cursor || null);
+    } catch (error) {
+      console.error('Error loading orders:', error);
+    }
+  };
+
   const updateOrderStatus = async (orderId: number, newStatus: string) => {
     try {
       await fetch(`${apiUrl}?action=order-status`, {
@@ -358,6 +372,13 @@ export default function AdminAnalytics() {
                       </div>
                     ))}
                   </div>
+                  {ordersCursor && (
+                    <div className="flex justify-center mt-4">
+                      <Button variant="outline" onClick={loadMoreOrders}>
+                        Показать ещё
+                      </Button>
+                    </div>
+                  )}
                 </CardContent>
               </Card>
             )}
@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { applyThemeStylesheet } from '@/hooks/useTheme';
 import { Link } from 'react-router-dom';
 
 const THEME_API_URL = 'https://functions.poehali.dev/ede28564-2e57-4545-aebb-ff117c81a6f4';
@@ -66,9 +67,12 @@ export default function AdminTheme() {
 
       if (!response.ok) throw new Error('Failed to update theme');
 
+      const data = await response.json();
+      if (data.stylesheet) applyThemeStylesheet(data.stylesheet);
+
       toast({
         title: 'Успешно',
-        description: 'Цвета обновлены. Обновите страницу, чтобы увидеть изменения',
+        description: 'Цвета обновлены',
       });
     } catch (error) {
       toast({
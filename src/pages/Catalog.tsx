@@ -34,31 +34,51 @@ export default function Catalog() {
   const [priceRange, setPriceRange] = useState<string>('all');
   const [selectedProduct, setSelectedProduct] = useState<Product | null>(null);
   const [modalOpen, setModalOpen] = useState(false);
+  const [categoryCounts, setCategoryCounts] = useState<Record<string, number>>({});
 
   useEffect(() => {
     loadProducts();
+    loadCategoryCounts();
   }, []);
 
+  const loadCategoryCounts = async () => {
+    try {
+      const response = await fetch(`${API_URL}?action=categories`);
+      if (!response.ok) return;
+      const data = await response.json();
+      const counts: Record<string, number> = {};
+      for (const item of data.categories || []) {
+        counts[item.category] = item.in_stock_count;
+      }
+      setCategoryCounts(counts);
+    } catch {
+      // Счётчики необязательны, фильтры работают и без них
+    }
+  };
+
+  const categoryLabel = (category: string) =>
+    categoryCounts[category] !== undefined ? `${category} (${categoryCounts[category]})` : category;
+
   const loadProducts = async () => {
     setLoading(true);
     setError(null);
     try {
-      // Загружаем все товары (по 10 за раз из-за больших изображений)
+      // Загружаем все товары постранично по курсору
       let allProducts: Product[] = [];
-      let offset = 0;
+      let cursor: string | null = null;
       const limit = 10;
       
       while (true) {
-        const response = await fetch(`${API_URL}?limit=${limit}&offset=${offset}`);
+        const query = cursor ? `after=${encodeURIComponent(cursor)}` : 'paginate=cursor';
+        const response = await fetch(`${API_URL}?limit=${limit}&${query}`);
         if (!response.ok) throw new Error('Failed to load products');
         const data = await response.json();
-        const batch = Array.isArray(data) ? data : [];
+        const batch: Product[] = Array.isArray(data.products) ? data.products : [];
         
-        if (batch.length === 0) break;
         allProducts = [...allProducts, ...batch];
         
-        if (batch.length < limit) break;
-        offset += limit;
+        if (!data.next_cursor) break;
+        cursor = data.next_cursor;
       }
       
       setProducts(allProducts);
@@ -78,9 +98,19 @@ export default function Catalog() {
     return true;
   });
 
-  const handleProductClick = (product: Product) => {
+  const handleProductClick = async (product: Product) => {
     setSelectedProduct(product);
     setModalOpen(true);
+    
+    // В списке приходит облегчённая карточка — догружаем описание и характеристики
+    try {
+      const response = await fetch(`${API_URL}?id=${product.id}`);
+      if (response.ok) {
+        setSelectedProduct(await response.json());
+      }
+    } catch (err) {
+      console.error('Failed to load product details:', err);
+    }
   };
 
   const calculateFinalPrice = (price: number, discount: number) => {
@@ -155,9 +185,9 @@ export default function Catalog() {
                     <Tabs value={selectedCategory} onValueChange={setSelectedCategory}>
                       <TabsList className="grid grid-cols-1 gap-2 h-auto p-1 bg-transparent">
                         <TabsTrigger value="all" className="justify-start text-xs md:text-sm px-2 md:px-3 py-2">Все товары</TabsTrigger>
-                        <TabsTrigger value="Одноразки" className="justify-start text-xs md:text-sm px-2 md:px-3 py-2">Одноразки</TabsTrigger>
-                        <TabsTrigger value="Жидкости" className="justify-start text-xs md:text-sm px-2 md:px-3 py-2">Жидкости</TabsTrigger>
-                        <TabsTrigger value="Аксессуары" className="justify-start text-xs md:text-sm px-2 md:px-3 py-2">Аксессуары</TabsTrigger>
+                        <TabsTrigger value="Одноразки" className="justify-start text-xs md:text-sm px-2 md:px-3 py-2">{categoryLabel('Одноразки')}</TabsTrigger>
+                        <TabsTrigger value="Жидкости" className="justify-start text-xs md:text-sm px-2 md:px-3 py-2">{categoryLabel('Жидкости')}</TabsTrigger>
+                        <TabsTrigger value="Аксессуары" className="justify-start text-xs md:text-sm px-2 md:px-3 py-2">{categoryLabel('Аксессуары')}</TabsTrigger>
                       </TabsList>
                     </Tabs>
                   </div>
@@ -85,9 +85,19 @@ export default function Index() {
 
   const featuredProducts = products.filter(p => p.is_new).slice(0, 8);
 
-  const handleProductClick = (product: Product) => {
+  const handleProductClick = async (product: Product) => {
     setSelectedProduct(product);
     setModalOpen(true);
+    
+    // В списке приходит облегчённая карточка — догружаем описание и характеристики
+    try {
+      const response = await fetch(`${API_URL}?id=${product.id}`);
+      if (response.ok) {
+        setSelectedProduct(await response.json());
+      }
+    } catch (err) {
+      console.error('Failed to load product details:', err);
+    }
   };
 
   const calculateFinalPrice = (price: number, discount: number) => {